@@ -0,0 +1,114 @@
+import threading
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Any, Optional
+
+
+class IncidentAggregates:
+    """Incrementally maintained incident counters
+
+    Keeps totals, resolved counts, per-priority and per-category counts and
+    per-day creation counts up to date as incidents are added and removed,
+    so dashboard insights and summary reports never have to walk the
+    incident list. Attach it to an IncidentStore with `add_listener`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def from_incidents(cls, incidents: List[Dict[str, Any]]) -> 'IncidentAggregates':
+        """Build counters for a plain incident list"""
+        aggregates = cls()
+        aggregates.reset(incidents)
+        return aggregates
+
+    def reset(self, incidents: Optional[List[Dict[str, Any]]] = None):
+        """Recount from scratch"""
+        with self._lock:
+            self.total = 0
+            self.resolved = 0
+            self.by_priority: Dict[str, int] = {}
+            self.open_by_priority: Dict[str, int] = {}
+            self.by_category: Dict[str, int] = {}
+            self.by_day: Dict[date, int] = {}
+        for incident in incidents or []:
+            self.add(incident)
+
+    @staticmethod
+    def _created_day(incident: Dict[str, Any]) -> Optional[date]:
+        try:
+            return datetime.strptime(incident['created_at'], '%Y-%m-%d %H:%M:%S').date()
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _bump(counts: Dict[Any, int], key, delta: int):
+        value = counts.get(key, 0) + delta
+        if value > 0:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+
+    def _count(self, incident: Dict[str, Any], delta: int):
+        resolved = incident.get('resolved', False)
+        priority = incident.get('priority', 'Medium')
+        with self._lock:
+            self.total += delta
+            if resolved:
+                self.resolved += delta
+            else:
+                self._bump(self.open_by_priority, priority, delta)
+            self._bump(self.by_priority, priority, delta)
+            if incident.get('ai_analysis'):
+                self._bump(self.by_category, incident['ai_analysis'].get('category', 'Unknown'), delta)
+            day = self._created_day(incident)
+            if day is not None:
+                self._bump(self.by_day, day, delta)
+
+    def add(self, incident: Dict[str, Any]):
+        """Count a stored incident"""
+        self._count(incident, 1)
+
+    def remove(self, incident: Dict[str, Any]):
+        """Uncount an incident that was updated or deleted"""
+        self._count(incident, -1)
+
+    def created_since(self, days: int = 7) -> int:
+        """Incidents created on or after `days` days ago; costs O(distinct days)"""
+        cutoff = date.today() - timedelta(days=days)
+        with self._lock:
+            return sum(count for day, count in self.by_day.items() if day >= cutoff)
+
+    def resolution_rate(self) -> float:
+        with self._lock:
+            return round((self.resolved / self.total * 100), 2) if self.total else 0
+
+    def export(self) -> Dict[str, Any]:
+        """All counters as plain JSON-friendly data, per-day counts included"""
+        counts = self.snapshot()
+        with self._lock:
+            counts['by_day'] = {day.isoformat(): count for day, count in self.by_day.items()}
+        return counts
+
+    def add_counts(self, counts: Dict[str, Any]):
+        """Add counters exported from another set of incidents (e.g. an archive segment)"""
+        with self._lock:
+            self.total += counts.get('total', 0)
+            self.resolved += counts.get('resolved', 0)
+            for field in ('by_priority', 'open_by_priority', 'by_category'):
+                for key, count in counts.get(field, {}).items():
+                    self._bump(getattr(self, field), key, count)
+            for day, count in counts.get('by_day', {}).items():
+                self._bump(self.by_day, date.fromisoformat(day), count)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """A consistent copy of the counters"""
+        with self._lock:
+            return {
+                'total': self.total,
+                'resolved': self.resolved,
+                'by_priority': dict(self.by_priority),
+                'open_by_priority': dict(self.open_by_priority),
+                'by_category': dict(self.by_category),
+            }
@@ -1,34 +1,545 @@
 import re
 import json
+import random
 import requests
 import os
-from datetime import datetime, date, timedelta
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional
+from aggregates import IncidentAggregates
+
+def _keyword_trie_pattern(keywords: List[str]) -> re.Pattern:
+    """Compile keywords into one regex shaped like a trie
+
+    Sibling branches start with distinct characters and optional tails are
+    greedy, so at any position the regex engine follows a single path and
+    the match is the longest keyword starting there.
+    """
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+    
+    return re.compile(build(trie))
+
+class AnalysisCache:
+    """Thread-safe LRU cache with a per-entry time-to-live"""
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        """Cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.clock() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+class RemoteAnalysisError(Exception):
+    """The remote model could not produce a usable analysis"""
+
+class RemoteModelClient:
+    """Chat-completions client for model-backed analysis
+
+    Keeps one pooled keep-alive requests.Session per process. Every call has
+    a total time budget shared by all attempts; transient failures
+    (connection errors, timeouts, 429 and 5xx) are retried with jittered
+    exponential backoff while budget remains.
+    """
+    
+    SYSTEM_PROMPT = (
+        "You are an incident triage assistant. Reply with a single JSON object with keys: "
+        "suggested_priority (one of Low, Medium, High, Critical), "
+        "category (one of Security, Infrastructure, Application, User Access, Data, General), "
+        "risk_level (one of Low, Medium, High) and "
+        "response_steps (a list of 4 to 6 short numbered steps such as \"1. Isolate affected systems\")."
+    )
+    
+    PRIORITIES = ('Low', 'Medium', 'High', 'Critical')
+    CATEGORIES = ('Security', 'Infrastructure', 'Application', 'User Access', 'Data', 'General')
+    RISK_LEVELS = ('Low', 'Medium', 'High')
+    
+    def __init__(self, api_url: str, model: str, api_key: str, timeout: float = 5.0,
+                 connect_timeout: float = 2.0, retries: int = 2, backoff: float = 0.2, pool_size: int = 10):
+        self.api_url = api_url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'last_latency_ms': None,
+            'max_latency_ms': 0.0,
+            'total_latency_ms': 0.0
+        }
+    
+    @property
+    def session(self) -> requests.Session:
+        # Sessions hold sockets, which must not be shared across a fork
+        if self._session is None or self._pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'Authorization': f"Bearer {self.api_key}",
+                'Content-Type': 'application/json'
+            })
+            self._session = session
+            self._pid = os.getpid()
+        return self._session
+    
+    def _record(self, latency_ms: float, ok: bool, retries: int):
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['successes' if ok else 'failures'] += 1
+            self.stats['retries'] += retries
+            self.stats['last_latency_ms'] = round(latency_ms, 2)
+            self.stats['max_latency_ms'] = round(max(self.stats['max_latency_ms'], latency_ms), 2)
+            self.stats['total_latency_ms'] = round(self.stats['total_latency_ms'] + latency_ms, 2)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['average_latency_ms'] = round(stats['total_latency_ms'] / stats['calls'], 2) if stats['calls'] else 0
+        return stats
+    
+    def complete(self, messages: List[Dict[str, str]]) -> str:
+        """Send a chat completion and return the reply text, within the time budget"""
+        payload = {'model': self.model, 'messages': messages, 'temperature': 0}
+        start = time.monotonic()
+        deadline = start + self.timeout
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise RemoteAnalysisError('Time budget exhausted')
+                response = self.session.post(
+                    self.api_url, json=payload,
+                    timeout=(min(self.connect_timeout, remaining), remaining)
+                )
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.exceptions.RetryError(f"HTTP {response.status_code}")
+                response.raise_for_status()
+                content = response.json()['choices'][0]['message']['content']
+                self._record((time.monotonic() - start) * 1000, True, attempt)
+                return content
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.RetryError) as e:
+                # Full jitter keeps many workers from retrying in lockstep
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+                if attempt >= self.retries or time.monotonic() + delay >= deadline:
+                    self._record((time.monotonic() - start) * 1000, False, attempt)
+                    raise RemoteAnalysisError(str(e)) from e
+                attempt += 1
+                time.sleep(delay)
+            except (requests.exceptions.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+                self._record((time.monotonic() - start) * 1000, False, attempt)
+                raise RemoteAnalysisError(str(e)) from e
+            except RemoteAnalysisError:
+                self._record((time.monotonic() - start) * 1000, False, attempt)
+                raise
+    
+    @staticmethod
+    def parse_json(content: str) -> Any:
+        """Parse a JSON reply, tolerating a surrounding markdown code fence"""
+        text = content.strip()
+        if text.startswith('```'):
+            text = text.strip('`')
+            text = text[text.find('\n') + 1:] if '\n' in text else text
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise RemoteAnalysisError(f"Model reply is not JSON: {e}") from e
+    
+    def validate(self, result: Any) -> Dict[str, Any]:
+        """Check a model analysis has the fields and values the app relies on"""
+        if not isinstance(result, dict):
+            raise RemoteAnalysisError('Model reply is not an object')
+        steps = result.get('response_steps')
+        if (result.get('suggested_priority') not in self.PRIORITIES
+                or result.get('category') not in self.CATEGORIES
+                or result.get('risk_level') not in self.RISK_LEVELS
+                or not isinstance(steps, list) or not steps
+                or not all(isinstance(step, str) for step in steps)):
+            raise RemoteAnalysisError('Model reply is missing or has invalid fields')
+        return {
+            'suggested_priority': result['suggested_priority'],
+            'category': result['category'],
+            'risk_level': result['risk_level'],
+            'response_steps': steps
+        }
+    
+    def analyze(self, description: str) -> Dict[str, Any]:
+        """Analyze one description with the model"""
+        content = self.complete([
+            {'role': 'system', 'content': self.SYSTEM_PROMPT},
+            {'role': 'user', 'content': description}
+        ])
+        return self.validate(self.parse_json(content))
+    
+    def analyze_many(self, descriptions: List[str]) -> List[Any]:
+        """Analyze several descriptions in one model call
+
+        Returns one entry per description, in order: the analysis, or a
+        RemoteAnalysisError for an item the model got wrong. A failed call
+        raises RemoteAnalysisError for the whole group.
+        """
+        content = self.complete([
+            {'role': 'system', 'content': self.SYSTEM_PROMPT + (
+                " You will receive a JSON array of incident descriptions. Reply with a JSON object "
+                "whose key \"results\" is an array with one such object per description, in the same order.")},
+            {'role': 'user', 'content': json.dumps(descriptions)}
+        ])
+        reply = self.parse_json(content)
+        items = reply.get('results') if isinstance(reply, dict) else reply
+        if not isinstance(items, list) or len(items) != len(descriptions):
+            raise RemoteAnalysisError('Model reply does not have one result per description')
+        results = []
+        for item in items:
+            try:
+                results.append(self.validate(item))
+            except RemoteAnalysisError as e:
+                results.append(e)
+        return results
 
 class AIProcessor:
     """AI-enhanced incident analysis and processing module"""
     
+    # Bump when the keyword rules change so cached analyses are not reused
+    RULES_VERSION = 1
+    
+    # Keyword rules, checked in order; the first rule with a hit wins
+    PRIORITY_KEYWORDS = [
+        ('Critical', ['ransomware', 'data breach', 'security breach', 'hack', 'malware', 'virus', 'ddos', 'attack', 'critical system down', 'outage']),
+        ('High', ['server down', 'network issue', 'database error', 'login problem', 'payment system', 'customer data']),
+        ('Medium', ['slow performance', 'minor bug', 'update needed', 'configuration'])
+    ]
+    
+    CATEGORY_KEYWORDS = [
+        ('Security', ['security', 'breach', 'hack', 'malware', 'virus', 'ransomware', 'attack']),
+        ('Infrastructure', ['server', 'network', 'hardware', 'outage', 'connectivity']),
+        ('Application', ['bug', 'error', 'crash', 'performance', 'slow']),
+        ('User Access', ['login', 'password', 'account', 'access', 'authentication']),
+        ('Data', ['database', 'data', 'backup', 'corruption'])
+    ]
+    
+    RISK_KEYWORDS = [
+        ('High', ['critical', 'breach', 'attack', 'ransomware', 'data loss']),
+        ('Medium', ['server', 'network', 'database', 'payment'])
+    ]
+    
+    RESPONSE_STEPS = [
+        # Security incident steps
+        (['security', 'breach', 'hack', 'malware', 'ransomware'], [
+            "1. Isolate affected systems immediately",
+            "2. Preserve forensic evidence", 
+            "3. Notify security team and management",
+            "4. Document all observed indicators",
+            "5. Begin containment procedures",
+            "6. Assess scope of compromise"
+        ]),
+        # Infrastructure issues
+        (['server', 'network', 'outage', 'connectivity'], [
+            "1. Verify system status and availability",
+            "2. Check network connectivity and routing",
+            "3. Review system logs for errors",
+            "4. Test failover systems if available",
+            "5. Notify affected users if necessary",
+            "6. Implement workaround if possible"
+        ]),
+        # Application issues
+        (['bug', 'error', 'crash', 'performance'], [
+            "1. Reproduce the issue if possible",
+            "2. Check application logs for errors",
+            "3. Verify recent deployments or changes",
+            "4. Test in staging environment",
+            "5. Implement temporary fix if available",
+            "6. Plan permanent solution"
+        ])
+    ]
+    
+    DEFAULT_RESPONSE_STEPS = [
+        "1. Gather detailed information about the issue",
+        "2. Assess impact and affected systems",
+        "3. Determine urgency and priority",
+        "4. Assign to appropriate team member",
+        "5. Document troubleshooting steps",
+        "6. Monitor for resolution"
+    ]
+    
     def __init__(self):
         self.ai_config = {
             'api_url': os.getenv('AI_API_URL', '<AI url u r using>'),
             'model': os.getenv('AI_MODEL', '<Any Model u need to use>'),
             'api_key': os.getenv('AI_API_KEY', '<Your API Key>')
         }
+        self.config_version = f"{self.RULES_VERSION}:{self.ai_config['model']}:{self.ai_config['api_url']}"
+        
+        # Model-backed analysis is used when AI_MODE is 'remote', or in 'auto'
+        # mode when AI_API_URL is a real URL; keyword heuristics otherwise
+        mode = os.getenv('AI_MODE', 'auto').lower()
+        has_endpoint = self.ai_config['api_url'].startswith(('http://', 'https://'))
+        self.remote = None
+        if mode == 'remote' or (mode == 'auto' and has_endpoint):
+            self.remote = RemoteModelClient(
+                self.ai_config['api_url'], self.ai_config['model'], self.ai_config['api_key'],
+                timeout=float(os.getenv('AI_TIMEOUT', '5')),
+                retries=int(os.getenv('AI_RETRIES', '2')),
+                pool_size=int(os.getenv('AI_POOL_SIZE', '10'))
+            )
+        self.batch_size = int(os.getenv('AI_BATCH_SIZE', '20'))
+        self.cache = AnalysisCache(
+            max_size=int(os.getenv('AI_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('AI_CACHE_TTL', '3600'))
+        )
+        self._build_matcher()
+    
+    def _build_matcher(self):
+        """Compile every rule keyword into a single matcher, built once"""
+        rule_sets = [self.PRIORITY_KEYWORDS, self.CATEGORY_KEYWORDS, self.RISK_KEYWORDS,
+                     [(tuple(steps), keywords) for keywords, steps in self.RESPONSE_STEPS]]
+        keywords = sorted({k for rules in rule_sets for _, words in rules for k in words})
+        self._keyword_pattern = _keyword_trie_pattern(keywords)
+        
+        # A match only reports the longest keyword at its position and the scan
+        # resumes after it. Keywords inside the match are implied by it; keywords
+        # that start inside it but run past its end are checked explicitly.
+        self._implied = {k: frozenset(other for other in keywords if other in k) for k in keywords}
+        self._overlapping = {
+            k: [(offset, other) for offset in range(1, len(k)) for other in keywords
+                if len(other) > len(k) - offset and other.startswith(k[offset:])]
+            for k in keywords
+        }
+        
+        self._priority_rules = [(level, frozenset(words)) for level, words in self.PRIORITY_KEYWORDS]
+        self._category_rules = [(category, frozenset(words)) for category, words in self.CATEGORY_KEYWORDS]
+        self._risk_rules = [(level, frozenset(words)) for level, words in self.RISK_KEYWORDS]
+        self._response_rules = [(frozenset(words), steps) for words, steps in self.RESPONSE_STEPS]
+    
+    def _scan(self, description: str) -> set:
+        """Every rule keyword occurring in the description, found in one pass"""
+        text = description.lower()
+        hits = set()
+        for match in self._keyword_pattern.finditer(text):
+            keyword = match.group()
+            hits |= self._implied[keyword]
+            for offset, other in self._overlapping[keyword]:
+                if text.startswith(other, match.start() + offset):
+                    hits.add(other)
+        return hits
+    
+    @staticmethod
+    def normalize_description(description: str) -> str:
+        """Case- and whitespace-insensitive form of a description, used as the cache key"""
+        return ' '.join(description.lower().split())
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the analysis cache"""
+        return dict(self.cache.stats(), config_version=self.config_version)
+    
+    def analysis_stats(self) -> Dict[str, Any]:
+        """Cache counters plus remote model call counts and latency"""
+        return {
+            'mode': 'remote' if self.remote else 'keywords',
+            'cache': self.cache_stats(),
+            'remote': self.remote.get_stats() if self.remote else None
+        }
     
     def analyze_incident(self, description: str) -> Dict[str, Any]:
-        """Analyze incident and provide AI-enhanced insights"""
+        """Analyze incident and provide AI-enhanced insights
+
+        The normalized description is what gets analysed and cached (with
+        the config version), so every spelling of it gets the same result
+        whichever came first; a cache hit only gets a fresh
+        analysis_timestamp.
+        """
+        text = self.normalize_description(description)
+        key = (text, self.config_version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, response_steps=list(cached['response_steps']),
+                        analysis_timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        
+        analysis = self._analyze_uncached(text)
+        # Errors and keyword fallbacks are not cached, so the model gets another try
+        if 'error' not in analysis and analysis.get('analysis_source') != 'keywords_fallback':
+            self.cache.put(key, analysis)
+            analysis = dict(analysis, response_steps=list(analysis['response_steps']))
+        return analysis
+    
+    def _analyze_uncached(self, description: str) -> Dict[str, Any]:
+        """Analyze with the remote model if configured, falling back to keywords"""
+        if self.remote is None:
+            return self._keyword_analysis(description)
+        
+        start = time.monotonic()
         try:
+            analysis = self.remote.analyze(description)
+        except RemoteAnalysisError as e:
+            print(f"AI model unavailable, using keyword analysis: {e}")
+            analysis = self._keyword_analysis(description)
+            analysis['analysis_source'] = 'keywords_fallback'
+            return analysis
+        analysis['analysis_timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        analysis['analysis_source'] = 'model'
+        analysis['model'] = self.ai_config['model']
+        analysis['latency_ms'] = round((time.monotonic() - start) * 1000, 2)
+        return analysis
+    
+    def analyze_batch(self, descriptions: List[str]) -> List[Dict[str, Any]]:
+        """Analyze many descriptions, returning results in input order
+
+        Duplicates (after normalization) are analysed once, as their
+        normalized text, and cached results are reused. With a remote model the remaining descriptions go out in
+        groups of AI_BATCH_SIZE per call. A bad item, or a group the model
+        fails on, only affects its own results: invalid input gets an
+        'error' entry and model failures fall back to keyword analysis.
+        """
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        unique: Dict[Any, str] = {}
+        keys: List[Any] = []
+        for description in descriptions:
+            if not isinstance(description, str) or not description.strip():
+                keys.append(None)
+                continue
+            text = self.normalize_description(description)
+            key = (text, self.config_version)
+            unique.setdefault(key, text)
+            keys.append(key)
+        
+        analyses: Dict[Any, Dict[str, Any]] = {}
+        pending = []
+        for key, description in unique.items():
+            cached = self.cache.get(key)
+            if cached is not None:
+                analyses[key] = dict(cached, analysis_timestamp=timestamp)
+            else:
+                pending.append((key, description))
+        
+        if self.remote is None:
+            for key, description in pending:
+                analyses[key] = self._keyword_analysis(description)
+        else:
+            for start in range(0, len(pending), max(self.batch_size, 1)):
+                group = pending[start:start + max(self.batch_size, 1)]
+                analyses.update(self._remote_group(group, timestamp))
+        
+        for key, description in pending:
+            analysis = analyses[key]
+            if 'error' not in analysis and analysis.get('analysis_source') != 'keywords_fallback':
+                self.cache.put(key, analysis)
+        
+        return [
+            dict(analyses[key], response_steps=list(analyses[key]['response_steps']))
+            if key is not None else {'error': 'Description cannot be blank'}
+            for key in keys
+        ]
+    
+    def _remote_group(self, group: List[Any], timestamp: str) -> Dict[Any, Dict[str, Any]]:
+        """Analyze one group of (key, description) pairs with a single model call"""
+        start = time.monotonic()
+        try:
+            replies = self.remote.analyze_many([description for _, description in group])
+        except RemoteAnalysisError as e:
+            print(f"AI model unavailable for batch, using keyword analysis: {e}")
+            replies = [e] * len(group)
+        latency_ms = round((time.monotonic() - start) * 1000, 2)
+        
+        results = {}
+        for (key, description), reply in zip(group, replies):
+            if isinstance(reply, RemoteAnalysisError):
+                analysis = self._keyword_analysis(description)
+                analysis['analysis_source'] = 'keywords_fallback'
+            else:
+                analysis = dict(reply, analysis_timestamp=timestamp, analysis_source='model',
+                                model=self.ai_config['model'], latency_ms=latency_ms)
+            results[key] = analysis
+        return results
+    
+    def _keyword_analysis(self, description: str) -> Dict[str, Any]:
+        """Run the keyword analysis"""
+        try:
+            hits = self._scan(description)
+            
             # Priority assessment based on keywords and context
-            priority = self._assess_priority(description)
+            priority = self._assess_priority(hits)
             
             # Generate suggested response steps
-            response_steps = self._generate_response_steps(description)
+            response_steps = self._generate_response_steps(hits)
             
             # Categorize the incident
-            category = self._categorize_incident(description)
+            category = self._categorize_incident(hits)
             
             # Risk assessment
-            risk_level = self._assess_risk(description)
+            risk_level = self._assess_risk(hits)
             
             return {
                 'suggested_priority': priority,
@@ -48,136 +559,57 @@ class AIProcessor:
                 'error': str(e)
             }
     
-    def _assess_priority(self, description: str) -> str:
+    def _assess_priority(self, hits: set) -> str:
         """Enhanced priority assessment using keyword analysis"""
-        critical_keywords = ['ransomware', 'data breach', 'security breach', 'hack', 'malware', 'virus', 'ddos', 'attack', 'critical system down', 'outage']
-        high_keywords = ['server down', 'network issue', 'database error', 'login problem', 'payment system', 'customer data']
-        medium_keywords = ['slow performance', 'minor bug', 'update needed', 'configuration']
-        
-        desc_lower = description.lower()
-        
-        if any(keyword in desc_lower for keyword in critical_keywords):
-            return 'Critical'
-        elif any(keyword in desc_lower for keyword in high_keywords):
-            return 'High'
-        elif any(keyword in desc_lower for keyword in medium_keywords):
-            return 'Medium'
-        
+        for level, keywords in self._priority_rules:
+            if hits & keywords:
+                return level
         return 'Low'
     
-    def _categorize_incident(self, description: str) -> str:
+    def _categorize_incident(self, hits: set) -> str:
         """Simple categorization based on keywords"""
-        categories = {
-            'Security': ['security', 'breach', 'hack', 'malware', 'virus', 'ransomware', 'attack'],
-            'Infrastructure': ['server', 'network', 'hardware', 'outage', 'connectivity'],
-            'Application': ['bug', 'error', 'crash', 'performance', 'slow'],
-            'User Access': ['login', 'password', 'account', 'access', 'authentication'],
-            'Data': ['database', 'data', 'backup', 'corruption']
-        }
-        
-        desc_lower = description.lower()
-        for category, keywords in categories.items():
-            if any(keyword in desc_lower for keyword in keywords):
+        for category, keywords in self._category_rules:
+            if hits & keywords:
                 return category
-        
         return 'General'
     
-    def _assess_risk(self, description: str) -> str:
+    def _assess_risk(self, hits: set) -> str:
         """Risk assessment based on potential impact"""
-        desc_lower = description.lower()
-        
-        if re.search(r'critical|breach|attack|ransomware|data loss', desc_lower):
-            return 'High'
-        elif re.search(r'server|network|database|payment', desc_lower):
-            return 'Medium'
-        else:
-            return 'Low'
+        for level, keywords in self._risk_rules:
+            if hits & keywords:
+                return level
+        return 'Low'
     
-    def _generate_response_steps(self, description: str) -> List[str]:
+    def _generate_response_steps(self, hits: set) -> List[str]:
         """Generate contextual response steps"""
-        desc_lower = description.lower()
-        
-        # Security incident steps
-        if re.search(r'security|breach|hack|malware|ransomware', desc_lower):
-            return [
-                "1. Isolate affected systems immediately",
-                "2. Preserve forensic evidence", 
-                "3. Notify security team and management",
-                "4. Document all observed indicators",
-                "5. Begin containment procedures",
-                "6. Assess scope of compromise"
-            ]
-        # Infrastructure issues
-        elif re.search(r'server|network|outage|connectivity', desc_lower):
-            return [
-                "1. Verify system status and availability",
-                "2. Check network connectivity and routing",
-                "3. Review system logs for errors",
-                "4. Test failover systems if available",
-                "5. Notify affected users if necessary",
-                "6. Implement workaround if possible"
-            ]
-        # Application issues
-        elif re.search(r'bug|error|crash|performance', desc_lower):
-            return [
-                "1. Reproduce the issue if possible",
-                "2. Check application logs for errors",
-                "3. Verify recent deployments or changes",
-                "4. Test in staging environment",
-                "5. Implement temporary fix if available",
-                "6. Plan permanent solution"
-            ]
-        else:
-            return [
-                "1. Gather detailed information about the issue",
-                "2. Assess impact and affected systems",
-                "3. Determine urgency and priority",
-                "4. Assign to appropriate team member",
-                "5. Document troubleshooting steps",
-                "6. Monitor for resolution"
-            ]
+        for keywords, steps in self._response_rules:
+            if hits & keywords:
+                return list(steps)
+        return list(self.DEFAULT_RESPONSE_STEPS)
     
     def generate_summary_report(self, incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Generate comprehensive summary report from incidents"""
-        total = len(incidents)
-        resolved = sum(1 for i in incidents if i.get('resolved', False))
-        open_incidents = total - resolved
-        
-        # Priority breakdown
-        priority_breakdown = {}
-        for incident in incidents:
-            priority = incident.get('priority', 'Medium')
-            priority_breakdown[priority] = priority_breakdown.get(priority, 0) + 1
-        
-        # Category breakdown (if available)
-        category_breakdown = {}
-        for incident in incidents:
-            if 'ai_analysis' in incident:
-                category = incident['ai_analysis'].get('category', 'Unknown')
-                category_breakdown[category] = category_breakdown.get(category, 0) + 1
-        
-        # Recent trends
-        recent_incidents = []
-        for incident in incidents:
-            try:
-                created_date = datetime.strptime(incident['created_at'], '%Y-%m-%d %H:%M:%S').date()
-                if created_date >= date.today() - timedelta(days=7):
-                    recent_incidents.append(incident)
-            except (ValueError, KeyError):
-                continue
+        return self.summary_from_aggregates(IncidentAggregates.from_incidents(incidents))
+    
+    def summary_from_aggregates(self, aggregates: IncidentAggregates) -> Dict[str, Any]:
+        """Generate the summary report from maintained counters without walking incidents"""
+        counts = aggregates.snapshot()
+        total = counts['total']
+        resolved = counts['resolved']
+        recent_incidents = aggregates.created_since(7)
         
         return {
             'summary': {
                 'total_incidents': total,
                 'resolved_incidents': resolved,
-                'open_incidents': open_incidents,
+                'open_incidents': total - resolved,
                 'resolution_rate': round((resolved / total * 100), 2) if total > 0 else 0
             },
-            'priority_breakdown': priority_breakdown,
-            'category_breakdown': category_breakdown,
+            'priority_breakdown': counts['by_priority'],
+            'category_breakdown': counts['by_category'],
             'recent_activity': {
-                'incidents_last_7_days': len(recent_incidents),
-                'average_per_day': round(len(recent_incidents) / 7.0, 2)
+                'incidents_last_7_days': recent_incidents,
+                'average_per_day': round(recent_incidents / 7.0, 2)
             },
             'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
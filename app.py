@@ -1,36 +1,194 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+import base64
 import json
 import uuid
 import os
-from datetime import datetime, date, timedelta
+import time
+import zlib
+from datetime import datetime, date
 from ai_processor import AIProcessor
+from aggregates import IncidentAggregates
+from archive import IncidentArchive
+from audit import AuditLogger, LOG_FILE
+from dedupe import DuplicateDetector
+from events import EventBroker
+from http_cache import ResponseCache
+from logs import LogReader
+from metrics import MetricsRegistry, instrument
+from profiling import RequestProfiler, PROFILE_HEADER, SORT_KEYS
+from search import SearchIndex
+from serialization import serializer
+from jobs import AnalysisQueue, QueueFull
+from storage import (IncidentStore, StorageLockTimeout, open_backend, page_incidents, timestamp_key,
+                     PRIORITY_RANK, SORT_ORDERS)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with the configured serializer (orjson when installed)
+
+    Responses are compact and keep dict insertion order, so encoding a
+    large incident list is one pass of the fast encoder.
+    """
+    
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        return serializer.dumps(obj, default=self.default, sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return serializer.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = serializer.dumps(obj, default=self.default, sort_keys=self.sort_keys) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # Configuration
-INCIDENT_FILE = 'incidents.json'
-LOG_FILE = 'incident_log.txt'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+MAX_LOG_PAGE_SIZE = 1000
+MAX_BULK_INCIDENTS = int(os.getenv('MAX_BULK_INCIDENTS', '100000'))
+MAX_BULK_LINE_BYTES = 64 * 1024
+MAX_BULK_ERRORS = 100
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '2'))
+ANALYSIS_QUEUE_SIZE = int(os.getenv('ANALYSIS_QUEUE_SIZE', '100'))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+SSE_BUFFER_SIZE = int(os.getenv('SSE_BUFFER_SIZE', '1000'))
+DEDUPE_THRESHOLD = float(os.getenv('DEDUPE_THRESHOLD', '0.8'))
+DEDUPE_WINDOW_HOURS = float(os.getenv('DEDUPE_WINDOW_HOURS', '24'))
+MAX_STORED_OCCURRENCES = 50
+# Element types of IncidentStore.sort_key per sort order, checked when a cursor is decoded
+CURSOR_KEY_TYPES = {'priority': (int, int, str), 'newest': (int, str), 'oldest': (int, str)}
 
 # Initialize AI processor
 ai_processor = AIProcessor()
 
+# Incident storage: configured backend (JSON journal or SQLite), served from memory
+store = IncidentStore(open_backend())
+
+# Dashboard/report counters, kept current by every store change
+aggregates = IncidentAggregates()
+store.add_listener(aggregates)
+
+# Full-text index over descriptions and response steps, built from the store at startup
+search_index = SearchIndex()
+store.add_listener(search_index)
+
+# Near-duplicates of recent open incidents become occurrences of them (DEDUPE_THRESHOLD=0 turns this off)
+duplicate_detector = None
+if DEDUPE_THRESHOLD > 0:
+    duplicate_detector = DuplicateDetector(DEDUPE_THRESHOLD, window_seconds=DEDUPE_WINDOW_HOURS * 3600)
+    store.add_listener(duplicate_detector)
+
+# Long-resolved incidents moved out of the store by `python archive.py`
+archive = IncidentArchive()
+
+# Push channel for dashboards; insights are computed lazily when subscribers wake
+event_broker = EventBroker(insights=lambda: _dashboard_insights(), buffer_size=SSE_BUFFER_SIZE)
+store.add_listener(event_broker)
+
+# Structured action log, shared with the CLI
+audit_log = AuditLogger.from_env(LOG_FILE, source='web')
+
+# Serialized read responses, reused until the data they were built from changes
+response_cache = ResponseCache()
+
+# Background AI analysis for created and re-described incidents
+analysis_queue = AnalysisQueue(store, ai_processor, workers=ANALYSIS_WORKERS, max_pending=ANALYSIS_QUEUE_SIZE)
+
+# Prometheus metrics served at /metrics
+metrics = MetricsRegistry()
+request_seconds = metrics.histogram('incident_http_request_duration_seconds',
+                                    'Time to handle a request (to the first byte for streamed responses)',
+                                    ['route', 'method'])
+request_count = metrics.counter('incident_http_requests_total', 'Requests handled', ['route', 'method', 'status'])
+storage_seconds = metrics.histogram('incident_storage_operation_seconds', 'Storage backend I/O', ['operation'])
+analysis_seconds = metrics.histogram('incident_analysis_seconds', 'AIProcessor stages', ['stage'])
+log_action_seconds = metrics.histogram('incident_log_action_seconds', 'Time spent in log_action',
+                                       buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.01, 0.1))
+instrument(store.backend, storage_seconds, {name: name for name in (
+    'load_state', 'changes_since', 'put', 'put_many', 'delete', 'delete_many', 'replace_all')})
+instrument(ai_processor, analysis_seconds, {
+    'analyze_incident': 'analyze', '_keyword_analysis': 'keywords', 'analyze_batch': 'batch',
+    'summary_from_aggregates': 'summary'})
+if ai_processor.remote is not None:
+    instrument(ai_processor.remote, analysis_seconds, {'analyze': 'model', 'analyze_many': 'model_batch'})
+
+def _storage_file_sizes():
+    """Bytes on disk per storage and log file"""
+    files = {name: getattr(store.backend, attribute) for name, attribute in
+             [('snapshot', 'snapshot_file'), ('journal', 'journal_file'), ('database', 'db_file')]
+             if hasattr(store.backend, attribute)}
+    files['audit_log'] = audit_log.path
+    return {(name,): os.path.getsize(path) if os.path.exists(path) else 0 for name, path in files.items()}
+
+metrics.gauge('incident_count', 'Incidents in the active store', lambda: aggregates.total)
+metrics.gauge('incident_open_count', 'Unresolved incidents', lambda: aggregates.total - aggregates.resolved)
+metrics.gauge('incident_file_size_bytes', 'Size of the storage and audit log files', _storage_file_sizes, ['file'])
+metrics.gauge('incident_analysis_queue_pending', 'Analyses waiting for a worker',
+              lambda: analysis_queue.stats()['pending'])
+metrics.gauge('incident_event_subscribers', 'Connected /events streams', lambda: event_broker.subscribers)
+
+def _timed_wsgi_app(wsgi_app):
+    """Record latency and status per route around the whole Flask app
+
+    Works on the WSGI environ directly: going through the request proxy
+    in before/after_request hooks would cost several times as much.
+    """
+    def timed(environ, start_response):
+        start = time.perf_counter()
+        seen = []
+        
+        def record_status(status, headers, exc_info=None):
+            # Called while the request context is live: Werkzeug keeps the request, and its matched rule, in the environ
+            rule = getattr(environ.get('werkzeug.request'), 'url_rule', None)
+            seen.append((rule.rule if rule is not None else 'unmatched', status.split(' ', 1)[0]))
+            return start_response(status, headers, exc_info)
+        
+        try:
+            return wsgi_app(environ, record_status)
+        finally:
+            route, status = seen[-1] if seen else ('unmatched', '500')
+            method = environ.get('REQUEST_METHOD', '')
+            request_seconds.observe(time.perf_counter() - start, route, method)
+            request_count.inc(route, method, status)
+    return timed
+
+app.wsgi_app = _timed_wsgi_app(app.wsgi_app)
+
+# Opt-in request profiling (PROFILE_TOKEN / PROFILE_SAMPLE_RATE); the hook is only installed when enabled
+profiler = RequestProfiler.from_env()
+if profiler.enabled:
+    app.wsgi_app = profiler.wrap(app.wsgi_app)
+
 def load_incidents():
-    """Load incidents from JSON file"""
-    if os.path.exists(INCIDENT_FILE):
-        with open(INCIDENT_FILE, 'r') as f:
-            return json.load(f)
-    return []
+    """Load incidents from the in-memory store"""
+    return store.all()
 
 def save_incidents(data):
-    """Save incidents to JSON file"""
-    with open(INCIDENT_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Save the full incident list as a new snapshot"""
+    store.replace_all(data)
 
 def log_action(action):
-    """Log actions to file"""
-    with open(LOG_FILE, 'a') as f:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S %z')
-        f.write(f"{action} at {timestamp}\n")
+    """Log actions to the audit log (written in the background)"""
+    start = time.perf_counter()
+    audit_log.log(action)
+    log_action_seconds.observe(time.perf_counter() - start)
+
+@app.before_request
+def recover_orphaned_analyses():
+    """Take over analyses queued by a worker that has since exited (throttled inside recover)"""
+    analysis_queue.recover()
+
+@app.errorhandler(StorageLockTimeout)
+def storage_busy(error):
+    """Storage lock could not be acquired in time"""
+    return jsonify({'error': 'Storage is busy, please retry'}), 503
 
 # Routes
 
@@ -39,11 +197,229 @@ def index():
     """Serve static HTML"""
     return send_file('index.html')
 
+def _encode_cursor(sort, key):
+    """Opaque pagination cursor for the last item of a page"""
+    payload = json.dumps([sort, list(key)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def _decode_cursor(cursor, sort):
+    """Decode a cursor produced by _encode_cursor for the same sort order"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('Cursor does not match the requested sort order')
+    # Must have the shape of IncidentStore.sort_key for this order, or comparing it would fail
+    types = CURSOR_KEY_TYPES[sort]
+    if not isinstance(key, list) or len(key) != len(types) or \
+            not all(isinstance(part, kind) and not isinstance(part, bool) for part, kind in zip(key, types)):
+        raise ValueError('Invalid cursor')
+    return key
+
+def _parse_created_bound(value, end_of_day=False):
+    """Parse a YYYY-MM-DD or YYYY-MM-DD HH:MM:SS bound into a timestamp key"""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d' and end_of_day:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return timestamp_key(parsed.strftime('%Y-%m-%d %H:%M:%S'))
+    raise ValueError(f"Invalid date: {value}")
+
+def _split_param(name):
+    """Comma-separated query parameter as a list, or None when absent"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return [v.strip() for v in value.split(',') if v.strip()]
+
 @app.route('/incidents', methods=['GET'])
 def get_incidents():
-    """Get all incidents"""
-    incidents = load_incidents()
-    return jsonify(incidents)
+    """Get incidents, optionally filtered, sorted and paginated
+
+    Without query parameters the full list is returned as before. Any of
+    status, priority, category, created_from, created_to, sort, limit or
+    cursor switches to a page: {'incidents', 'total', 'next_cursor'}.
+    include_archived=true also pages through archived incidents.
+    """
+    if not request.args:
+        return _conditional_json(('incidents', b''), (store.version,), load_incidents)
+    
+    try:
+        filters = _query_filters()
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        after = _decode_cursor(cursor, filters['sort']) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    include_archived = request.args.get('include_archived', '').lower() in ['true', '1', 'yes']
+    
+    def build_page():
+        incidents, total, last_key = store.query(after=after, limit=limit, **filters)
+        if include_archived:
+            incidents, total, last_key = _merge_archived(incidents, total, last_key, filters, after, limit)
+        return {
+            'incidents': incidents,
+            'total': total,
+            'next_cursor': _encode_cursor(filters['sort'], last_key) if last_key else None
+        }
+    
+    version = (store.version, archive.signature()) if include_archived else (store.version,)
+    return _conditional_json(('incidents', request.query_string), version, build_page)
+
+def _merge_archived(incidents, total, last_key, filters, after, limit):
+    """Combine a page of active incidents with the matching archived ones"""
+    sort = filters['sort']
+    archived = archive.incidents(filters['resolved'], filters['priorities'], filters['categories'],
+                                 filters['created_from'], filters['created_to'])
+    archived, archived_total, archived_last = page_incidents(archived, sort=sort, after=after, limit=limit)
+    merged, _, merged_last = page_incidents(incidents + archived, sort=sort, limit=limit)
+    if merged_last is None and merged and (last_key or archived_last):
+        # Either source may still have items beyond this page
+        merged_last = IncidentStore.sort_key(merged[-1], sort)
+    return merged, total + archived_total, merged_last
+
+def _conditional_json(key, version, build):
+    """JSON response tagged with an ETag for `version`
+
+    Answers 304 when the client's If-None-Match is current, and reuses the
+    body already serialized for this version when there is one; `build` is
+    only called when neither applies.
+    """
+    etag = response_cache.etag(*version)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        body = response_cache.get(key, etag)
+        if body is None:
+            body = jsonify(build()).get_data()
+            response_cache.put(key, etag, body)
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _query_filters(default_sort='priority'):
+    """Parse the shared incident filter parameters into IncidentStore.query arguments"""
+    statuses = set(_split_param('status') or [])
+    if statuses - {'open', 'resolved', 'all'}:
+        raise ValueError('status must be open, resolved or all')
+    resolved = None
+    if len(statuses) == 1 and 'all' not in statuses:
+        resolved = 'resolved' in statuses
+    
+    priorities = _split_param('priority')
+    if priorities and set(priorities) - set(PRIORITY_RANK):
+        raise ValueError('priority must be one of Low, Medium, High, Critical')
+    
+    created_from = request.args.get('created_from')
+    created_to = request.args.get('created_to')
+    created_from = _parse_created_bound(created_from) if created_from else None
+    created_to = _parse_created_bound(created_to, end_of_day=True) if created_to else None
+    
+    sort = request.args.get('sort', default_sort)
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+    
+    return {
+        'resolved': resolved,
+        'priorities': priorities,
+        'categories': _split_param('category'),
+        'created_from': created_from,
+        'created_to': created_to,
+        'sort': sort
+    }
+
+@app.route('/incidents/search', methods=['GET'])
+def search_incidents():
+    """Full-text search over descriptions and response steps, best matches first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    # Changes from other processes reach the index through the store's refresh
+    store.refresh()
+    # Unstripped: a trailing space means the last word is complete rather than a prefix
+    matches, total = search_index.search(request.args.get('q', ''), limit)
+    incidents = []
+    for incident_id, score in matches:
+        incident = store.get(incident_id)
+        if incident is not None:
+            incidents.append(dict(incident, score=score))
+    return jsonify({'query': query, 'total': total, 'incidents': incidents})
+
+@app.route('/incidents/export', methods=['GET'])
+def export_incidents():
+    """Stream incidents as NDJSON (default) or a JSON array
+
+    Takes the same filters as GET /incidents (sorted oldest first unless
+    ?sort= says otherwise). The response is produced in chunks from a
+    snapshot of the matching records, so it starts right away and is never
+    held in memory as one string. Clients that accept gzip get it gzipped.
+    """
+    try:
+        filters = _query_filters(default_sort='oldest')
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'json'):
+            raise ValueError('format must be ndjson or json')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Records are replaced rather than mutated on update, so this list is a stable snapshot
+    incidents, _, _ = store.query(**filters)
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    chunks = _export_chunks(incidents, export_format)
+    if use_gzip:
+        chunks = _gzip_chunks(chunks)
+    
+    extension = 'ndjson' if export_format == 'ndjson' else 'json'
+    response = Response(chunks, mimetype='application/x-ndjson' if export_format == 'ndjson' else 'application/json')
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=incidents-{datetime.now().strftime('%Y%m%d')}.{extension}")
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _export_chunks(incidents, export_format, chunk_size=64 * 1024):
+    """Encode incidents lazily, yielding roughly chunk_size bytes at a time"""
+    array = export_format == 'json'
+    buffer, size = [b'['] if array else [], 0
+    for n, incident in enumerate(incidents):
+        encoded = serializer.dumps(incident)
+        if array:
+            encoded = encoded if n == 0 else b',' + encoded
+        else:
+            encoded += b'\n'
+        buffer.append(encoded)
+        size += len(encoded)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if array:
+        buffer.append(b']')
+    if buffer:
+        yield b''.join(buffer)
+
+def _gzip_chunks(chunks):
+    """Gzip a byte stream incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
 @app.route('/incidents/analyze', methods=['POST'])
 def analyze_incident():
@@ -64,6 +440,27 @@ def analyze_incident():
     
     return jsonify(analysis)
 
+@app.route('/incidents/analyze/batch', methods=['POST'])
+def analyze_incident_batch():
+    """AI analysis for many descriptions in one request"""
+    data = request.get_json(silent=True)
+    descriptions = data.get('descriptions') if isinstance(data, dict) else data
+    
+    if not isinstance(descriptions, list) or not descriptions:
+        return jsonify({'error': 'Provide a non-empty JSON list of descriptions'}), 400
+    if len(descriptions) > MAX_BATCH_SIZE:
+        return jsonify({'error': f"At most {MAX_BATCH_SIZE} descriptions per batch"}), 400
+    
+    results = ai_processor.analyze_batch(descriptions)
+    log_action(f"AI batch analysis performed for {len(descriptions)} descriptions")
+    
+    return jsonify({'results': results})
+
+@app.route('/incidents/analyze/stats', methods=['GET'])
+def analysis_stats():
+    """AI analysis cache counters and remote model latency"""
+    return jsonify(ai_processor.analysis_stats())
+
 @app.route('/incidents', methods=['POST'])
 def create_incident():
     """Create a new incident with AI analysis"""
@@ -73,7 +470,76 @@ def create_incident():
     else:
         data = request.form.to_dict()
     
-    description = data.get('description', '').strip()
+    try:
+        new_incident, use_ai = _new_incident(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    description = new_incident['description']
+    dedupe = data.get('dedupe', True)
+    if isinstance(dedupe, str):
+        dedupe = dedupe.lower() in ['true', '1', 'yes']
+    
+    # The check and the write share one transaction so a burst of duplicates finds a single parent
+    with store.transaction():
+        duplicate = _find_duplicate(description) if dedupe else None
+        if duplicate is not None:
+            parent, similarity = duplicate
+            parent = _add_occurrence(parent, new_incident, escalate=bool(data.get('priority')))
+        else:
+            # AI analysis runs in the background; refuse early rather than store work we cannot queue
+            if use_ai and not analysis_queue.has_capacity():
+                return _analysis_queue_full()
+            
+            if use_ai:
+                new_incident.update(analysis_queue.pending_fields(apply_priority=not data.get('priority')))
+            
+            store.add(new_incident)
+    
+    if duplicate is not None:
+        log_action(f"Duplicate incident recorded as occurrence of {parent['id']}: {description}")
+        return jsonify(dict(parent, duplicate_similarity=round(similarity, 3))), 200
+    
+    if use_ai:
+        # Use AI suggested priority if user hasn't explicitly set one
+        new_incident = _queue_analysis(new_incident, apply_priority=not data.get('priority'))
+    
+    # Log the action
+    ai_suffix = ' (with AI analysis)' if use_ai else ''
+    log_action(f"Incident created{ai_suffix}: {description}")
+    
+    return jsonify(new_incident), 201
+
+def _find_duplicate(description):
+    """An open incident the description nearly duplicates, with the similarity, or None"""
+    if duplicate_detector is None:
+        return None
+    # Let incidents written by other processes reach the detector first
+    store.refresh()
+    match = duplicate_detector.match(description)
+    if match is None:
+        return None
+    parent = store.get(match[0])
+    if parent is None or parent.get('resolved'):
+        return None
+    return parent, match[1]
+
+def _add_occurrence(parent, incident, escalate=False):
+    """Record a near-duplicate report on its parent incident instead of storing it separately"""
+    occurrence = {key: incident[key] for key in ('id', 'description', 'priority', 'created_at')}
+    changes = {
+        # Only the latest reports are kept in full; the count covers them all
+        'occurrences': ((parent.get('occurrences') or []) + [occurrence])[-MAX_STORED_OCCURRENCES:],
+        'occurrence_count': parent.get('occurrence_count', 1) + 1,
+        'last_seen_at': incident['created_at']
+    }
+    if escalate and PRIORITY_RANK[incident['priority']] > PRIORITY_RANK.get(parent.get('priority'), 0):
+        changes['priority'] = incident['priority']
+    return store.update(parent['id'], changes)
+
+def _new_incident(data):
+    """Validate create fields, returning the new record and whether AI analysis was asked for"""
+    description = data.get('description', '')
+    description = description.strip() if isinstance(description, str) else ''
     priority = data.get('priority', 'Medium')
     use_ai = data.get('use_ai', False)
     
@@ -82,90 +548,210 @@ def create_incident():
         use_ai = use_ai.lower() in ['true', '1', 'yes']
     
     if not description:
-        return jsonify({'error': 'Description cannot be blank'}), 400
+        raise ValueError('Description cannot be blank')
     
     # Validate priority
     if priority not in ['Low', 'Medium', 'High', 'Critical']:
         priority = 'Medium'
     
-    # Perform AI analysis if requested
-    ai_analysis = None
-    if use_ai:
-        ai_analysis = ai_processor.analyze_incident(description)
-        # Use AI suggested priority if user hasn't explicitly set one
-        if not data.get('priority'):
-            priority = ai_analysis.get('suggested_priority', 'Medium')
-    
-    new_incident = {
+    return {
         'id': str(uuid.uuid4()),
         'description': description,
         'priority': priority,
         'resolved': False,
         'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'resolved_at': None,
-        'ai_analysis': ai_analysis
-    }
-    
-    incidents = load_incidents()
-    incidents.append(new_incident)
-    save_incidents(incidents)
-    
-    # Log the action
-    ai_suffix = ' (with AI analysis)' if use_ai else ''
-    log_action(f"Incident created{ai_suffix}: {description}")
+        'ai_analysis': None
+    }, bool(use_ai)
+
+@app.route('/incidents/bulk', methods=['POST'])
+def bulk_create_incidents():
+    """Create incidents from an NDJSON upload, one incident object per line
+
+    The body is read a line at a time, so only the parsed incidents (which
+    the store keeps anyway) and a short result per created line are held in
+    memory; only the first MAX_BULK_ERRORS rejected lines are reported
+    individually, the rest are counted.
+    AI analysis, when a line sets use_ai or ?use_ai=true is given, runs in
+    batches while reading. Everything is stored with one backend write.
+    """
+    default_ai = request.args.get('use_ai', '').lower() in ['true', '1', 'yes']
+    incidents = []
+    results = []
+    to_analyze = []
+    failed = 0
+    
+    def reject(line_no, error):
+        nonlocal failed
+        failed += 1
+        if failed <= MAX_BULK_ERRORS:
+            results.append({'line': line_no, 'error': error})
+    
+    for line_no, line in enumerate(_ndjson_lines(request.stream), start=1):
+        if line is None:
+            reject(line_no, f"Line longer than {MAX_BULK_LINE_BYTES} bytes")
+            continue
+        if not line.strip():
+            continue
+        if len(incidents) >= MAX_BULK_INCIDENTS:
+            reject(line_no, f"At most {MAX_BULK_INCIDENTS} incidents per upload")
+            continue
+        try:
+            data = serializer.loads(line)
+        except ValueError:
+            reject(line_no, 'Invalid JSON')
+            continue
+        try:
+            if not isinstance(data, dict):
+                raise ValueError('Expected a JSON object')
+            data.setdefault('use_ai', default_ai)
+            incident, use_ai = _new_incident(data)
+        except ValueError as e:
+            reject(line_no, str(e))
+            continue
+        incidents.append(incident)
+        results.append({'line': line_no, 'id': incident['id']})
+        if use_ai:
+            to_analyze.append((incident, not data.get('priority')))
+            if len(to_analyze) >= ai_processor.batch_size:
+                _apply_batch_analysis(to_analyze)
+                to_analyze = []
+    _apply_batch_analysis(to_analyze)
+    
+    if incidents:
+        store.add_many(incidents)
+    log_action(f"Bulk import: {len(incidents)} incidents created, {failed} lines rejected")
+    
+    return jsonify({
+        'created': len(incidents),
+        'failed': failed,
+        'unreported_errors': max(failed - MAX_BULK_ERRORS, 0),
+        'results': results
+    }), 201 if incidents else 400
+
+def _ndjson_lines(stream):
+    """Yield decoded lines from a request stream, or None for an over-long line"""
+    while True:
+        line = stream.readline(MAX_BULK_LINE_BYTES + 1)
+        if not line:
+            return
+        if len(line) > MAX_BULK_LINE_BYTES and not line.endswith(b'\n'):
+            # Skip the rest of the line without buffering it
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(MAX_BULK_LINE_BYTES)
+            yield None
+            continue
+        yield line.decode('utf-8', errors='replace')
+
+def _apply_batch_analysis(pending):
+    """Attach batch AI analysis to (incident, apply_priority) pairs"""
+    if not pending:
+        return
+    analyses = ai_processor.analyze_batch([incident['description'] for incident, _ in pending])
+    for (incident, apply_priority), analysis in zip(pending, analyses):
+        incident['ai_analysis'] = analysis
+        incident['analysis_status'] = 'failed' if 'error' in analysis else 'complete'
+        if apply_priority and 'error' not in analysis:
+            incident['priority'] = analysis.get('suggested_priority', 'Medium')
+
+def _analysis_queue_full():
+    response = jsonify({'error': 'AI analysis queue is full, please retry shortly'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def _queue_analysis(incident, apply_priority):
+    """Queue background analysis for a stored incident, returning its current record"""
+    try:
+        job = analysis_queue.submit(incident['id'], incident['description'], apply_priority)
+    except QueueFull:
+        # Filled up since the capacity check; the incident is stored, so record that analysis was skipped
+        return store.update(incident['id'], {'analysis_status': 'failed'}) or incident
+    current = store.get(incident['id']) or incident
+    return dict(current, analysis_job=job['id'])
+
+@app.route('/incidents/<incident_id>/analysis', methods=['GET'])
+def get_analysis_status(incident_id):
+    """Background analysis status for an incident"""
+    incident = store.get(incident_id)
+    if not incident:
+        return jsonify({'error': 'Incident not found'}), 404
     
-    return jsonify(new_incident), 201
+    job_id = request.args.get('job')
+    return jsonify({
+        'incident_id': incident_id,
+        'analysis_status': incident.get('analysis_status'),
+        'ai_analysis': incident.get('ai_analysis'),
+        'job': analysis_queue.job(job_id) if job_id else None
+    })
+
+@app.route('/incidents/analysis/queue', methods=['GET'])
+def get_analysis_queue():
+    """Background analysis queue depth and counters"""
+    return jsonify(analysis_queue.stats())
 
 @app.route('/reports/summary', methods=['GET'])
 def generate_summary_report():
     """Generate AI summary report"""
-    incidents = load_incidents()
-    report = ai_processor.generate_summary_report(incidents)
+    def build_report():
+        # Archived incidents count through their segments' precomputed counters
+        combined = IncidentAggregates()
+        combined.add_counts(aggregates.export())
+        combined.add_counts(archive.totals())
+        return ai_processor.summary_from_aggregates(combined)
+    
+    # Logged for every request, including cached and 304 responses
     log_action("AI summary report generated")
-    return jsonify(report)
+    # The 7-day figures move with the date even when no incident changes
+    return _conditional_json(('summary',), (store.version, archive.signature(), date.today()), build_report)
 
 @app.route('/insights', methods=['GET'])
 def get_insights():
     """Get AI insights for dashboard"""
-    incidents = load_incidents()
-    
-    # Recent trends
-    last_week = []
-    for incident in incidents:
-        try:
-            created_date = datetime.strptime(incident['created_at'], '%Y-%m-%d %H:%M:%S').date()
-            if created_date >= date.today() - timedelta(days=7):
-                last_week.append(incident)
-        except (ValueError, KeyError):
-            continue
+    return _conditional_json(('insights',), (store.version, date.today()), _dashboard_insights)
+
+def _dashboard_insights():
+    """Dashboard insights from the incremental counters"""
+    counts = aggregates.snapshot()
+    weekly_incidents = aggregates.created_since(7)
     
     # High priority incidents
-    high_priority = [i for i in incidents if i.get('priority') in ['High', 'Critical'] and not i.get('resolved', False)]
+    high_priority_open = sum(counts['open_by_priority'].get(p, 0) for p in ['High', 'Critical'])
     
     # Category trends (from AI analysis)
-    categories = {}
-    for incident in incidents:
-        if 'ai_analysis' in incident:
-            category = incident['ai_analysis'].get('category', 'Unknown')
-            categories[category] = categories.get(category, 0) + 1
+    categories = counts['by_category']
     
     # Find most affected category
     most_affected = max(categories.items(), key=lambda x: x[1])[0] if categories else 'None'
     
-    insights = {
+    return {
         'alerts': {
-            'high_priority_open': len(high_priority),
-            'recent_spike': len(last_week) > 10,
+            'high_priority_open': high_priority_open,
+            'recent_spike': weekly_incidents > 10,
             'categories_most_affected': most_affected
         },
         'trends': {
-            'weekly_incidents': len(last_week),
+            'weekly_incidents': weekly_incidents,
             'category_breakdown': categories,
-            'resolution_rate': round((sum(1 for i in incidents if i.get('resolved', False)) / len(incidents) * 100), 2) if incidents else 0
+            'resolution_rate': aggregates.resolution_rate()
         }
     }
-    
-    return jsonify(insights)
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of incident changes and dashboard insights
+
+    Reconnecting clients send Last-Event-ID and receive what they missed,
+    or a 'reset' event when it is no longer buffered.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(
+        event_broker.stream(last_event_id, heartbeat=SSE_HEARTBEAT, on_idle=store.refresh),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/incidents/<incident_id>', methods=['PUT'])
 def update_incident(incident_id):
@@ -178,8 +764,7 @@ def update_incident(incident_id):
     
     description = data.get('description', '').strip()
     
-    incidents = load_incidents()
-    incident = next((i for i in incidents if i['id'] == incident_id), None)
+    incident = store.get(incident_id)
     
     if not incident:
         return jsonify({'error': 'Incident not found'}), 404
@@ -188,7 +773,7 @@ def update_incident(incident_id):
         return jsonify({'error': 'Description cannot be blank'}), 400
     
     old_description = incident['description']
-    incident['description'] = description
+    changes = {'description': description}
     
     # Re-run AI analysis if description changed significantly
     reanalyze = data.get('reanalyze')
@@ -196,29 +781,36 @@ def update_incident(incident_id):
         reanalyze = reanalyze.lower() in ['true', '1', 'yes']
     
     if reanalyze:
-        incident['ai_analysis'] = ai_processor.analyze_incident(description)
+        if not analysis_queue.has_capacity():
+            return _analysis_queue_full()
+        changes.update(analysis_queue.pending_fields(apply_priority=False))
         log_action(f"Incident updated with AI re-analysis:\nFrom: {old_description}\nTo: {description}")
     else:
+        if incident.get('analysis_status') == 'pending':
+            # The queued job analysed the old description and will not be applied
+            changes['analysis_status'] = 'cancelled'
         log_action(f"Incident updated:\nFrom: {old_description}\nTo: {description}")
     
-    save_incidents(incidents)
+    incident = store.update(incident_id, changes)
+    if not incident:
+        return jsonify({'error': 'Incident not found'}), 404
+    
+    if reanalyze:
+        incident = _queue_analysis(incident, apply_priority=False)
     
     return jsonify(incident)
 
 @app.route('/incidents/<incident_id>/resolve', methods=['PATCH'])
 def resolve_incident(incident_id):
     """Resolve an incident"""
-    incidents = load_incidents()
-    incident = next((i for i in incidents if i['id'] == incident_id), None)
+    incident = store.update(incident_id, {
+        'resolved': True,
+        'resolved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
     
     if not incident:
         return jsonify({'error': 'Incident not found'}), 404
     
-    incident['resolved'] = True
-    incident['resolved_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    save_incidents(incidents)
-    
     # Log the action
     log_action(f"Incident resolved: {incident['description']}")
     
@@ -227,29 +819,93 @@ def resolve_incident(incident_id):
 @app.route('/incidents/<incident_id>', methods=['DELETE'])
 def delete_incident(incident_id):
     """Delete an incident"""
-    incidents = load_incidents()
-    incident_index = next((i for i, inc in enumerate(incidents) if inc['id'] == incident_id), None)
+    deleted = store.delete(incident_id)
     
-    if incident_index is None:
+    if deleted is None:
         return jsonify({'error': 'Incident not found'}), 404
     
-    deleted = incidents.pop(incident_index)
-    save_incidents(incidents)
-    
     # Log the action
     log_action(f"Incident deleted: {deleted['description']}")
     
     return jsonify(deleted)
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics: request latency and counts, subsystem timers and gauges"""
+    return Response(metrics.render(), mimetype=MetricsRegistry.CONTENT_TYPE)
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Recent request profiles, newest first (requires the X-Profile-Token header)"""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    return jsonify({'profiles': profiler.captures()})
+
+@app.route('/admin/profiles/<capture_id>', methods=['GET'])
+def get_profile(capture_id):
+    """One request profile as a pstats report, or the raw .prof file with format=prof"""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    path = profiler.path(capture_id)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    if request.args.get('format') == 'prof':
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=os.path.basename(path))
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        return jsonify({'error': f"sort must be one of: {', '.join(SORT_KEYS)}"}), 400
+    try:
+        limit = max(1, int(request.args.get('limit', 50)))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    report = profiler.report(capture_id, sort, limit)
+    if report is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(report, mimetype='text/plain')
+
 @app.route('/logs', methods=['GET'])
 def get_logs():
-    """Get logs"""
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'r') as f:
-            logs = [line.strip() for line in f.readlines()]
-        return jsonify({'logs': logs})
-    else:
-        return jsonify({'logs': []})
+    """Get log entries
+
+    With no parameters every entry is returned. tail=N returns the last N
+    entries (cursor=<next_cursor> pages further back); since=<offset>
+    returns entries written after an earlier response's offset, up to
+    limit. Multi-line entries come back as one string.
+    """
+    reader = LogReader(LOG_FILE)
+    try:
+        tail = request.args.get('tail')
+        since = request.args.get('since')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit')
+        tail = max(0, min(int(tail), MAX_LOG_PAGE_SIZE)) if tail is not None else None
+        since = max(0, int(since)) if since is not None else None
+        cursor = max(0, int(cursor)) if cursor else None
+        limit = max(1, min(int(limit), MAX_LOG_PAGE_SIZE)) if limit is not None else MAX_LOG_PAGE_SIZE
+    except ValueError:
+        return jsonify({'error': 'tail, since, cursor and limit must be integers'}), 400
+    
+    def build_logs():
+        if tail is not None:
+            logs, next_cursor, offset = reader.tail(tail, before=cursor)
+            return {'logs': logs, 'next_cursor': str(next_cursor) if next_cursor else None, 'offset': offset}
+        if since is not None:
+            logs, offset = reader.since(since, limit)
+            return {'logs': logs, 'offset': offset}
+        return {'logs': reader.all()}
+    
+    try:
+        stat = os.stat(LOG_FILE)
+        fingerprint = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        fingerprint = ('missing',)
+    return _conditional_json(('logs', request.query_string), fingerprint, build_logs)
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=4506, debug=True)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import argparse
+import gzip
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+import serialization
+from aggregates import IncidentAggregates
+from storage import FileLock, IncidentStore, open_backend, timestamp_key, incident_category
+
+ARCHIVE_DIR = os.getenv('INCIDENT_ARCHIVE_DIR', 'archive')
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+
+
+class IncidentArchive:
+    """Cold storage for incidents resolved long ago
+
+    archive() moves incidents resolved more than N days ago out of the
+    active store into gzipped NDJSON segments, one per month of
+    resolution, and records each segment's incident counters (the same
+    ones IncidentAggregates keeps) and created_at range in manifest.json.
+    Reports add those counters instead of reopening segments; listing
+    archived incidents reads only segments whose manifest entry can match
+    the filters.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, self.MANIFEST)
+        self._lock = None
+        self._cached = (None, {'segments': {}, 'pending': []}, None)
+
+    def signature(self):
+        """Changes whenever the archive does (None while it is empty)"""
+        try:
+            stat = os.stat(self.manifest_file)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_ino}.{stat.st_mtime_ns}.{stat.st_size}"
+
+    def manifest(self) -> Dict[str, Any]:
+        """The segment manifest, re-read only when the file changes"""
+        signature = self.signature()
+        if signature != self._cached[0]:
+            manifest = {'segments': {}, 'pending': []}
+            if signature is not None:
+                with open(self.manifest_file, 'rb') as f:
+                    manifest = serialization.loads(f.read())
+            totals = IncidentAggregates()
+            for segment in manifest['segments'].values():
+                totals.add_counts(segment['aggregates'])
+            self._cached = (signature, manifest, totals)
+        return self._cached[1]
+
+    def totals(self) -> Dict[str, Any]:
+        """Counters for every archived incident, from the manifest alone"""
+        self.manifest()
+        totals = self._cached[2]
+        return totals.export() if totals is not None else IncidentAggregates().export()
+
+    def _file_lock(self) -> FileLock:
+        if self._lock is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock = FileLock(os.path.join(self.directory, 'archive.lock'))
+        return self._lock
+
+    def archive(self, store: IncidentStore, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                now: Optional[datetime] = None) -> int:
+        """Move incidents resolved more than `older_than_days` ago into the archive
+
+        All of it runs under the store's write lock. Segments and the
+        manifest (listing the moved ids as pending) are written before the
+        incidents leave the store; if a crash interrupts the move, the next
+        run finishes deleting the pending ids instead of archiving them
+        twice.
+        """
+        cutoff = timestamp_key(((now or datetime.now()) - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S'))
+        with self._file_lock().exclusive(), store.transaction():
+            # A private copy: the cached manifest must not change until the new one is on disk
+            manifest = serialization.loads(serialization.dumps(self.manifest()))
+            if manifest.get('pending'):
+                store.delete_many(manifest['pending'])
+                manifest['pending'] = []
+                self._write_manifest(manifest)
+
+            by_month: Dict[str, List[Dict[str, Any]]] = {}
+            for incident in store.all():
+                resolved_at = incident.get('resolved_at')
+                if incident.get('resolved') and resolved_at and timestamp_key(resolved_at) < cutoff:
+                    by_month.setdefault(resolved_at[:7], []).append(incident)
+            if not by_month:
+                return 0
+
+            for month, incidents in sorted(by_month.items()):
+                self._append_segment(manifest, month, incidents)
+            moved = [i['id'] for incidents in by_month.values() for i in incidents]
+            manifest['pending'] = moved
+            self._write_manifest(manifest)
+            store.delete_many(moved)
+            manifest['pending'] = []
+            self._write_manifest(manifest)
+            return len(moved)
+
+    def _append_segment(self, manifest: Dict[str, Any], month: str, incidents: List[Dict[str, Any]]):
+        segment = manifest['segments'].setdefault(month, {
+            'file': f"incidents-{month}.ndjson.gz",
+            'count': 0,
+            'created_from': None,
+            'created_to': None,
+            'aggregates': IncidentAggregates().export()
+        })
+        # Each run adds a gzip member; readers see the members as one stream
+        with gzip.open(os.path.join(self.directory, segment['file']), 'ab') as f:
+            for incident in incidents:
+                f.write(serialization.dumps(incident) + b'\n')
+            f.flush()
+            os.fsync(f.fileobj.fileno())
+
+        counts = IncidentAggregates()
+        counts.add_counts(segment['aggregates'])
+        counts.add_counts(IncidentAggregates.from_incidents(incidents).export())
+        segment['aggregates'] = counts.export()
+        segment['count'] += len(incidents)
+        created = sorted(i.get('created_at') or '' for i in incidents)
+        segment['created_from'] = min(filter(None, [segment['created_from'], created[0]]), default=None)
+        segment['created_to'] = max(filter(None, [segment['created_to'], created[-1]]), default=None)
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        fd, tmp_file = tempfile.mkstemp(prefix='.manifest-', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(serialization.dumps(manifest))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.manifest_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def incidents(self, resolved: Optional[bool] = None, priorities: Optional[List[str]] = None,
+                  categories: Optional[List[str]] = None, created_from: Optional[int] = None,
+                  created_to: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Archived incidents matching the filters (date range included), reading only segments that can match"""
+        if resolved is False:
+            return []
+        matches = []
+        seen = set()
+        for month, segment in sorted(self.manifest()['segments'].items()):
+            counts = segment['aggregates']
+            if priorities is not None and not any(counts['by_priority'].get(p) for p in priorities):
+                continue
+            if categories is not None and not any(counts['by_category'].get(c) for c in categories):
+                continue
+            if created_from is not None and timestamp_key(segment['created_to']) < created_from:
+                continue
+            if created_to is not None and timestamp_key(segment['created_from']) > created_to:
+                continue
+            with gzip.open(os.path.join(self.directory, segment['file']), 'rb') as f:
+                for line in f:
+                    incident = serialization.loads(line)
+                    # A move interrupted before the manifest was written can leave repeated lines
+                    if incident['id'] in seen:
+                        continue
+                    seen.add(incident['id'])
+                    if priorities is not None and incident.get('priority') not in priorities:
+                        continue
+                    if categories is not None and incident_category(incident) not in categories:
+                        continue
+                    created = timestamp_key(incident.get('created_at'))
+                    if created_from is not None and created < created_from:
+                        continue
+                    if created_to is not None and created > created_to:
+                        continue
+                    matches.append(incident)
+        return matches
+
+
+def main():
+    """Archive long-resolved incidents from the configured storage backend"""
+    parser = argparse.ArgumentParser(description='Move long-resolved incidents into the archive')
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='archive incidents resolved more than this many days ago')
+    parser.add_argument('--dir', default=ARCHIVE_DIR, help='archive directory')
+    args = parser.parse_args()
+
+    moved = IncidentArchive(args.dir).archive(IncidentStore(open_backend()), args.older_than_days)
+    print(f"Archived {moved} incidents resolved more than {args.older_than_days} days ago into {args.dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import atexit
+import glob
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any
+
+import serialization
+from storage import FileLock
+
+LOG_FILE = os.getenv('AUDIT_LOG_FILE', 'incident_log.txt')
+
+
+def format_entry(record: Dict[str, Any]) -> str:
+    """Render a structured audit record the way /logs has always shown entries"""
+    timestamp = str(record.get('ts', '')).replace('T', ' ')
+    return f"{record.get('action', '')} at {timestamp}"
+
+
+class AuditLogger:
+    """Buffered JSON-lines audit log shared by the web app and the CLI
+
+    log() only puts the record on a bounded in-memory queue; a background
+    thread writes whatever has accumulated every `flush_interval` seconds,
+    so request threads never wait on disk I/O (if the queue is ever full
+    the record is dropped and counted instead). With fsync='batch' every
+    written batch is fsynced. The file is rotated once it reaches
+    `max_bytes` or is `rotate_seconds` old; old segments are gzipped and
+    only the newest `backups` are kept.
+    """
+
+    def __init__(self, path: str = LOG_FILE, source: str = 'web', flush_interval: float = 1.0,
+                 fsync: str = 'never', max_bytes: int = 10 * 1024 * 1024, rotate_seconds: float = 0,
+                 backups: int = 10, compress: bool = True, max_pending: int = 10000):
+        if fsync not in ('never', 'batch'):
+            raise ValueError("fsync must be 'never' or 'batch'")
+        # Resolved now: the writer thread must not depend on the working directory at write time
+        self.path = os.path.abspath(path)
+        self.source = source
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.compress = compress
+        self.max_pending = max_pending
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.path + '.lock')
+        self._pid = None
+        self._file = None
+        self._segment = None
+        self.written = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    @classmethod
+    def from_env(cls, path: str = LOG_FILE, source: str = 'web') -> 'AuditLogger':
+        """Logger configured from AUDIT_* environment variables"""
+        return cls(
+            path,
+            source=source,
+            flush_interval=float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0')),
+            fsync=os.getenv('AUDIT_FSYNC', 'never'),
+            max_bytes=int(os.getenv('AUDIT_MAX_BYTES', str(10 * 1024 * 1024))),
+            rotate_seconds=float(os.getenv('AUDIT_ROTATE_SECONDS', '0')),
+            backups=int(os.getenv('AUDIT_BACKUPS', '10')),
+            compress=os.getenv('AUDIT_COMPRESS', 'true').lower() in ['true', '1', 'yes']
+        )
+
+    def log(self, action: str, **fields):
+        """Queue an audit record; never blocks"""
+        record = {
+            'ts': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'source': self.source,
+            'action': action
+        }
+        record.update(fields)
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self):
+        """Wait until everything queued so far is on disk"""
+        if self._pid == os.getpid():
+            # The marker makes the writer stop collecting and write straight away
+            self._queue.put(None)
+            self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'pending': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+
+    def _ensure_writer(self):
+        # Threads do not survive a fork, so each process starts its own writer
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # A forked child: the parent's queue and file handle are not ours to use
+                self._queue = queue.Queue(maxsize=self.max_pending)
+            self._pid = os.getpid()
+            self._file = None
+        threading.Thread(target=self._run, name='audit-writer', daemon=True).start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Let records accumulate for up to a flush interval, then write them together
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                records = [record for record in batch if record is not None]
+                if records:
+                    self._write(records)
+            except Exception as e:
+                print(f"Error writing audit log: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        data = b''.join(serialization.dumps(record) + b'\n' for record in batch)
+        with self._file_lock.exclusive():
+            f = self._open()
+            if self._should_rotate(f):
+                self._rotate()
+                f = self._open()
+            f.write(data)
+            f.flush()
+            if self.fsync == 'batch':
+                os.fsync(f.fileno())
+        with self._lock:
+            self.written += len(batch)
+
+    def _open(self):
+        """The log file handle, reopened if another process rotated the file"""
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if self._file is not None and os.fstat(self._file.fileno()).st_ino != current:
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def _should_rotate(self, f) -> bool:
+        stat = os.fstat(f.fileno())
+        if stat.st_size == 0:
+            return False
+        if self.max_bytes and stat.st_size >= self.max_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._segment_started(stat) >= self.rotate_seconds
+
+    def _segment_started(self, stat) -> float:
+        """When the current file was started: its first record's timestamp, read once per file"""
+        if self._segment is None or self._segment[0] != stat.st_ino:
+            try:
+                with open(self.path, 'rb') as f:
+                    started = datetime.fromisoformat(serialization.loads(f.readline())['ts']).timestamp()
+            except (OSError, ValueError, KeyError, TypeError):
+                # A legacy text log: count from when this process first saw it
+                started = time.time()
+            self._segment = (stat.st_ino, started)
+        return self._segment[1]
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        segment = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        os.replace(self.path, segment)
+        if self.compress:
+            with open(segment, 'rb') as src, gzip.open(segment + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(segment)
+        segments = sorted(glob.glob(glob.escape(self.path) + '.*[0-9]') + glob.glob(glob.escape(self.path) + '.*.gz'))
+        for old in segments[:max(len(segments) - self.backups, 0)]:
+            os.remove(old)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the incident response hot paths
+Run: python benchmark.py [analysis|serialization|suite] [--sizes 10000 100000 1000000]
+
+`suite` is the non-interactive regression run: it writes machine-readable
+results and compares them with a saved baseline, exiting 1 on regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from ai_processor import AIProcessor, AnalysisCache
+from serialization import StdlibSerializer, get_serializer, orjson, serializer
+
+FILLER_WORDS = (
+    "the service reported elevated latency after the nightly deploy and several users "
+    "opened tickets about intermittent timeouts on the checkout page while the on call "
+    "engineer reviewed dashboards metrics traces and recent change requests"
+).split()
+
+INCIDENT_PHRASES = [
+    "server down", "ransomware detected", "login problem", "database error",
+    "slow performance", "payment system unavailable", "minor bug", "network issue"
+]
+
+def make_description(length, rng):
+    """Filler text of roughly `length` characters with one incident phrase"""
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    words.insert(rng.randrange(len(words) + 1), rng.choice(INCIDENT_PHRASES))
+    return ' '.join(words)
+
+def time_per_call(func, args_list, min_seconds=0.5):
+    """Average seconds per call over the argument list, repeated for at least min_seconds"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for args in args_list:
+            func(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+def bench_analysis(lengths=(100, 1000, 10000, 100000)):
+    """Throughput of AIProcessor.analyze_incident by description length"""
+    rng = random.Random(42)
+    processor = AIProcessor()
+    print("AIProcessor.analyze_incident")
+    for length in lengths:
+        descriptions = [(make_description(length, rng),) for _ in range(20)]
+        per_call = time_per_call(processor.analyze_incident, descriptions)
+        mb_per_second = length / per_call / 1e6
+        print(f"  {length:>7} chars: {per_call * 1e6:10.1f} us/call  {1 / per_call:10.0f} calls/s  {mb_per_second:6.1f} MB/s")
+
+SERVICES = ['checkout', 'payments', 'auth', 'search', 'inventory', 'billing', 'email', 'vpn', 'reporting']
+REGIONS = ['us-east', 'us-west', 'eu-central', 'ap-south']
+DEPARTMENTS = ['finance', 'sales', 'engineering', 'support', 'hr']
+
+INCIDENT_TEMPLATES = [
+    "{service} service returning {code} errors for {pct}% of requests in {region}",
+    "Server down: {host} not responding to health checks",
+    "Ransomware detected on {host}, files encrypted in the {dept} share",
+    "Phishing email reported by the {dept} team, {n} users clicked the link",
+    "Login problem for {service} users after deploy {build}",
+    "Database error: replication lag of {n}s on {host}",
+    "Payment system unavailable for customers in {region}",
+    "Slow performance on the {service} dashboard, p95 latency {n}00ms",
+    "Network issue: packet loss between {region} and {region2}",
+    "Minor bug in {service} export formatting",
+    "Disk usage at {pct}% on {host}, backup jobs failing",
+    "Suspected data breach: unusual downloads of customer data from {host}",
+    "SSL certificate for {service}.example.com expires in {n} days",
+    "DDoS attack against the {service} API from {n} source addresses",
+]
+
+# Share of incidents per priority, roughly as they arrive in production
+PRIORITY_WEIGHTS = [('Low', 30), ('Medium', 40), ('High', 22), ('Critical', 8)]
+
+def make_incident_description(rng):
+    """A realistic incident description: service, host, region and error details filled in"""
+    service = rng.choice(SERVICES)
+    return rng.choice(INCIDENT_TEMPLATES).format(
+        service=service,
+        host=f"{service}-{rng.randint(1, 40):02d}.{rng.choice(REGIONS)}.internal",
+        region=rng.choice(REGIONS),
+        region2=rng.choice(REGIONS),
+        dept=rng.choice(DEPARTMENTS),
+        code=rng.choice([500, 502, 503, 504]),
+        pct=rng.randint(5, 99),
+        n=rng.randint(2, 90),
+        build=f"{rng.randint(1, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 9)}"
+    )
+
+def make_incidents(count, rng, resolved_ratio=0.7, days=365, now=None):
+    """Synthetic incidents shaped like the stored ones
+
+    Created over the last `days` days; older incidents are more likely to
+    be resolved, `resolved_ratio` of them overall. A third carry an AI
+    analysis.
+    """
+    now = now or datetime.now()
+    priorities = [p for p, _ in PRIORITY_WEIGHTS]
+    weights = [w for _, w in PRIORITY_WEIGHTS]
+    # P(resolved) = age ** exponent rises with age and averages resolved_ratio over uniform ages
+    exponent = 1 / resolved_ratio - 1 if resolved_ratio > 0 else None
+    incidents = []
+    for n in range(count):
+        age = rng.random()
+        created = now - timedelta(days=days * age, seconds=rng.randrange(86400))
+        resolved = exponent is not None and rng.random() < age ** exponent
+        resolved_at = min(created + timedelta(hours=rng.uniform(0.5, 72)), now) if resolved else None
+        analysed = n % 3 == 0
+        incidents.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'description': make_incident_description(rng),
+            'priority': rng.choices(priorities, weights)[0],
+            'resolved': resolved,
+            'created_at': created.strftime('%Y-%m-%d %H:%M:%S'),
+            'resolved_at': resolved_at.strftime('%Y-%m-%d %H:%M:%S') if resolved_at else None,
+            'ai_analysis': {
+                'suggested_priority': rng.choice(priorities),
+                'category': rng.choice(['Security', 'Infrastructure', 'Application', 'User Access', 'Data']),
+                'risk_level': rng.choice(['Low', 'Medium', 'High']),
+                'response_steps': ['1. Assess impact', '2. Notify stakeholders'],
+                'analysis_timestamp': created.strftime('%Y-%m-%d %H:%M:%S')
+            } if analysed else None
+        })
+    return incidents
+
+def time_best(func, args_list, min_seconds=0.2, rounds=3):
+    """Best per-call seconds over at least `rounds` passes through the argument list
+
+    The minimum is the most repeatable figure on a busy machine, which is
+    what a regression comparison needs.
+    """
+    best = None
+    passes = 0
+    start = time.perf_counter()
+    while passes < rounds or time.perf_counter() - start < min_seconds:
+        began = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        per_call = (time.perf_counter() - began) / len(args_list)
+        best = per_call if best is None else min(best, per_call)
+        passes += 1
+    return best
+
+def time_once(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def bench_serialization(sizes=(10000, 100000, 1000000)):
+    """Snapshot save/load and response encoding: the old indented stdlib JSON against the serializers"""
+    rng = random.Random(42)
+    stdlib = StdlibSerializer()
+    candidates = [
+        # What storage and jsonify did before: indent=2 files, sorted-key responses
+        ('json indent=2 (old)', lambda data: json.dumps(data, indent=2).encode(),
+         lambda data: json.dumps(data, separators=(',', ':'), sort_keys=True).encode(), json.loads),
+        ('json compact', stdlib.dumps, stdlib.dumps, stdlib.loads),
+    ]
+    if orjson is not None:
+        fast = get_serializer('orjson')
+        candidates.append(('orjson', fast.dumps, fast.dumps, fast.loads))
+    else:
+        print("orjson is not installed; only the stdlib serializers are compared")
+    
+    print("Snapshot save / load and response encode")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'incidents.json')
+        for size in sizes:
+            incidents = make_incidents(size, rng)
+            for name, save_dumps, response_dumps, file_loads in candidates:
+                def save():
+                    with open(path, 'wb') as f:
+                        f.write(save_dumps(incidents))
+                def load():
+                    with open(path, 'rb') as f:
+                        return file_loads(f.read())
+                save_seconds, _ = time_once(save)
+                megabytes = os.path.getsize(path) / 1e6
+                load_seconds, loaded = time_once(load)
+                assert len(loaded) == size
+                encode_seconds, _ = time_once(lambda: response_dumps(incidents))
+                print(f"  {size:>8} incidents  {name:<20} file {megabytes:8.1f} MB  save {save_seconds:7.3f}s  "
+                      f"load {load_seconds:7.3f}s  encode {encode_seconds:7.3f}s")
+            del incidents
+
+def _bench_app(directory, storage):
+    """The Flask app pointed at a scratch store, counters, archive and log under `directory`"""
+    import app as app_module
+    from aggregates import IncidentAggregates
+    from archive import IncidentArchive
+    from audit import AuditLogger
+    from http_cache import ResponseCache
+    from storage import IncidentJournal, IncidentStore, SQLiteBackend
+    
+    def open_store():
+        if storage == 'sqlite':
+            return IncidentStore(SQLiteBackend(os.path.join(directory, 'incidents.db')))
+        return IncidentStore(IncidentJournal(os.path.join(directory, 'incidents.json')))
+    
+    store = open_store()
+    aggregates = IncidentAggregates()
+    store.add_listener(aggregates)
+    app_module.store = store
+    app_module.aggregates = aggregates
+    app_module.archive = IncidentArchive(os.path.join(directory, 'archive'))
+    app_module.response_cache = ResponseCache()
+    app_module.audit_log = AuditLogger(os.path.join(directory, 'incident_log.txt'))
+    return app_module, open_store
+
+def run_suite(sizes, storage='json', min_seconds=0.2, resolved_ratio=0.7):
+    """Time the storage, analysis and report hot paths; returns {metric: seconds}"""
+    from http_cache import ResponseCache
+    
+    rng = random.Random(42)
+    results = {}
+    
+    # Analysis does not depend on the data set size: measured once, with and without the cache
+    processor = AIProcessor()
+    processor.remote = None
+    descriptions = [(make_incident_description(rng),) for _ in range(200)]
+    processor.cache = AnalysisCache(max_size=0)
+    results['analyze_incident'] = time_best(processor.analyze_incident, descriptions, min_seconds)
+    processor.cache = AnalysisCache()
+    results['analyze_incident_cached'] = time_best(processor.analyze_incident, descriptions, min_seconds)
+    
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # Lock files and anything else written relative to the working directory stay in the scratch dir
+        os.chdir(directory)
+        try:
+            for size in sizes:
+                incidents = make_incidents(size, rng, resolved_ratio)
+                os.makedirs(os.path.join(directory, str(size)))
+                app_module, open_store = _bench_app(os.path.join(directory, str(size)), storage)
+                client = app_module.app.test_client()
+                
+                def load_cold():
+                    assert len(open_store().all()) == size
+                
+                def uncached_get(path):
+                    # A fresh response cache makes every request rebuild its body
+                    app_module.response_cache = ResponseCache()
+                    response = client.get(path)
+                    assert response.status_code == 200, response.status_code
+                
+                results[f'{size}/save_incidents'] = time_best(app_module.save_incidents, [(incidents,)], min_seconds)
+                results[f'{size}/load_incidents_cold'] = time_best(load_cold, [()], min_seconds)
+                results[f'{size}/load_incidents'] = time_best(app_module.load_incidents, [()], min_seconds)
+                results[f'{size}/summary_report'] = time_best(uncached_get, [('/reports/summary',)], min_seconds)
+                results[f'{size}/insights'] = time_best(uncached_get, [('/insights',)], min_seconds)
+                app_module.audit_log.flush()
+                del incidents
+        finally:
+            os.chdir(previous_directory)
+    return results
+
+def compare_results(results, baseline, tolerance):
+    """Print current timings against the baseline; returns the metrics slower by more than `tolerance`"""
+    regressions = []
+    print(f"  {'metric':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, seconds in results.items():
+        before = baseline.get(metric)
+        if before is None:
+            print(f"  {metric:<32} {'-':>12} {seconds * 1e3:10.3f}ms {'new':>8}")
+            continue
+        change = seconds / before - 1 if before else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(metric)
+            flag = '  REGRESSION'
+        print(f"  {metric:<32} {before * 1e3:10.3f}ms {seconds * 1e3:10.3f}ms {change:+7.0%}{flag}")
+    return regressions
+
+def suite(sizes, storage, min_seconds, resolved_ratio, output, baseline_file, save_baseline, tolerance):
+    """Run the suite, write `output` and compare with (or save) the baseline; returns the exit status"""
+    print(f"Benchmark suite: {', '.join(str(s) for s in sizes)} incidents, {storage} storage")
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'serializer': serializer.name,
+            'storage': storage,
+            'sizes': sizes,
+            'resolved_ratio': resolved_ratio
+        },
+        'results': run_suite(sizes, storage, min_seconds, resolved_ratio)
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if save_baseline:
+        with open(baseline_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_file}")
+        return 0
+    if not os.path.exists(baseline_file):
+        print(f"No baseline at {baseline_file}; run with --save-baseline to record one")
+        for metric, seconds in report['results'].items():
+            print(f"  {metric:<32} {seconds * 1e3:10.3f}ms")
+        return 0
+    
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    print(f"Compared with {baseline_file} ({baseline['meta']['timestamp']}), tolerance {tolerance:.0%}")
+    for key in ('python', 'serializer', 'storage', 'resolved_ratio'):
+        if baseline['meta'].get(key) != report['meta'][key]:
+            print(f"  note: baseline {key} was {baseline['meta'].get(key)}, now {report['meta'][key]}")
+    regressions = compare_results(report['results'], baseline['results'], tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Incident response benchmarks')
+    parser.add_argument('benchmark', nargs='?', choices=['analysis', 'serialization', 'suite', 'all'], default='all')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help='incident counts (serialization default: 10000 100000 1000000; suite: 1000 10000 100000)')
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json', help='suite storage backend')
+    parser.add_argument('--min-seconds', type=float, default=0.2, help='suite: minimum time spent per measurement')
+    parser.add_argument('--resolved-ratio', type=float, default=0.7, help='suite: share of generated incidents resolved')
+    parser.add_argument('--output', default='bench_results.json', help='suite: results file')
+    parser.add_argument('--baseline', default='bench_baseline.json', help='suite: baseline file to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='suite: store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='suite: slowdown (fraction) beyond which a metric counts as a regression')
+    args = parser.parse_args()
+    
+    status = 0
+    if args.benchmark in ('analysis', 'all'):
+        bench_analysis()
+    if args.benchmark in ('serialization', 'all'):
+        bench_serialization(args.sizes or [10000, 100000, 1000000])
+    if args.benchmark in ('suite', 'all'):
+        status = suite(args.sizes or [1000, 10000, 100000], args.storage, args.min_seconds, args.resolved_ratio,
+                       args.output, args.baseline, args.save_baseline, args.tolerance)
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
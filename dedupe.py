@@ -0,0 +1,162 @@
+import hashlib
+import operator
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+
+def _band_layout(threshold: float, num_perm: int, recall: float = 0.9) -> Tuple[int, int]:
+    """(bands, rows) for LSH: the most selective layout still finding `recall` of pairs at `threshold`"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        # Chance that a pair at exactly the threshold shares at least one band
+        if 1 - (1 - threshold ** rows) ** bands < recall:
+            break
+        best = (bands, rows)
+    return best
+
+
+class DuplicateDetector:
+    """MinHash/LSH index of open incidents for near-duplicate detection
+
+    Descriptions are normalised and cut into overlapping character
+    shingles; a MinHash signature of `num_perm` values estimates the
+    Jaccard similarity of two shingle sets. Each shingle's `num_perm`
+    hashes come from a single SHAKE-128 digest. Signatures are split into
+    bands, and incidents sharing any band land in the same bucket, so a
+    lookup only compares against a handful of candidates however many
+    incidents are open. Attach it to an IncidentStore with `add_listener`:
+    only unresolved incidents created within the last `window_seconds`
+    (0 for no limit) are indexed, since a burst of duplicates arrives
+    together; older entries are pruned as new ones come in.
+    """
+
+    def __init__(self, threshold: float = 0.8, window_seconds: float = 86400, num_perm: int = 128,
+                 shingle_size: int = 4):
+        if not 0 < threshold <= 1:
+            raise ValueError('threshold must be between 0 and 1')
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _band_layout(threshold, num_perm)
+        self._unpack = struct.Struct(f'<{num_perm}I').unpack
+        self._lock = threading.Lock()
+        self.reset()
+
+    def shingles(self, description: str) -> set:
+        """Character shingles of a normalised description"""
+        text = ' '.join(re.findall(r'\w+', (description or '').lower())).encode('utf-8')
+        size = self.shingle_size
+        if len(text) <= size:
+            return {text} if text else set()
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def signature(self, description: str) -> Optional[Tuple[int, ...]]:
+        """MinHash signature of a description (None when it has no words)"""
+        shingles = self.shingles(description)
+        if not shingles:
+            return None
+        digest_size = 4 * self.num_perm
+        hashes = [self._unpack(hashlib.shake_128(shingle).digest(digest_size)) for shingle in shingles]
+        return tuple(map(min, zip(*hashes)))
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def similarity(self, first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(map(operator.eq, first, second)) / self.num_perm
+
+    def _cutoff(self) -> float:
+        return time.time() - self.window_seconds if self.window_seconds else 0.0
+
+    @staticmethod
+    def _created(incident: Dict[str, Any]) -> float:
+        try:
+            return datetime.fromisoformat(incident['created_at']).timestamp()
+        except (ValueError, KeyError, TypeError):
+            return 0.0
+
+    def match(self, description: str) -> Optional[Tuple[str, float]]:
+        """The most similar indexed incident at or above the threshold: (id, similarity)"""
+        signature = self.signature(description)
+        if signature is None:
+            return None
+        with self._lock:
+            cutoff = self._cutoff()
+            self._prune(cutoff)
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            best = None
+            for incident_id in candidates:
+                other, created = self._entries[incident_id]
+                if created < cutoff:
+                    continue
+                similarity = self.similarity(signature, other)
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (incident_id, similarity)
+            return best
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _prune(self, cutoff: float):
+        # Entries are kept in arrival order, which is close to creation order
+        while self._entries:
+            incident_id, (_, created) = next(iter(self._entries.items()))
+            if created >= cutoff:
+                break
+            self._unindex(incident_id)
+
+    def _unindex(self, incident_id: str):
+        entry = self._entries.pop(incident_id, None)
+        if entry is None:
+            return
+        for key in self._band_keys(entry[0]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(incident_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    # Store listener protocol
+
+    def reset(self, incidents: Optional[List[Dict[str, Any]]] = None):
+        with self._lock:
+            self._entries: Dict[str, Tuple[Tuple[int, ...], float]] = {}
+            self._buckets: Dict[Tuple[int, Tuple[int, ...]], set] = {}
+        cutoff = self._cutoff()
+        recent = [i for i in incidents or [] if not i.get('resolved') and self._created(i) >= cutoff]
+        for incident in sorted(recent, key=self._created):
+            self.add(incident)
+
+    def add(self, incident: Dict[str, Any]):
+        created = self._created(incident)
+        if incident.get('resolved') or created < self._cutoff():
+            return
+        signature = self.signature(incident.get('description'))
+        if signature is None:
+            return
+        with self._lock:
+            self._entries[incident['id']] = (signature, created)
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(incident['id'])
+
+    def remove(self, incident: Dict[str, Any]):
+        with self._lock:
+            self._unindex(incident['id'])
+
+    def update(self, old: Dict[str, Any], new: Dict[str, Any]):
+        if old.get('description') == new.get('description') and bool(old.get('resolved')) == bool(new.get('resolved')):
+            # New occurrences, analysis results and the like leave the signature alone
+            return
+        self.remove(old)
+        self.add(new)
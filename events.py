@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Any, Optional, Callable
+
+import serialization
+
+
+class EventBroker:
+    """Fan-out of incident changes to Server-Sent Events subscribers
+
+    Attach it to an IncidentStore with `add_listener`; every create,
+    update, resolve and delete becomes a numbered event. The last
+    `buffer_size` events are kept so a reconnecting client can resume from
+    its Last-Event-ID. A client that fell further behind (or a full reload
+    of the store) gets a 'reset' event telling it to refetch. Dashboard
+    insights are pushed as one coalesced 'insights' event after each burst
+    of changes rather than once per change.
+    """
+
+    def __init__(self, insights: Optional[Callable[[], Dict[str, Any]]] = None, buffer_size: int = 1000):
+        self.insights = insights
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._insights_stale = False
+        self._condition = threading.Condition()
+        self.subscribers = 0
+        # Event ids carry a per-process prefix so an id from before a restart (or from another worker) is never mistaken for a current one
+        self._epoch = os.urandom(4).hex()
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """Record an event and wake subscribers"""
+        payload = serialization.dumps(data).decode('utf-8')
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, event, payload))
+            if event != 'insights':
+                self._insights_stale = True
+            self._condition.notify_all()
+
+    # Store listener protocol
+
+    def reset(self, incidents: Optional[List[Dict[str, Any]]] = None):
+        self.publish('reset', {})
+
+    def add(self, incident: Dict[str, Any]):
+        self.publish('created', {'incident': incident})
+
+    def remove(self, incident: Dict[str, Any]):
+        self.publish('deleted', {'id': incident['id']})
+
+    def update(self, old: Dict[str, Any], new: Dict[str, Any]):
+        event = 'resolved' if new.get('resolved') and not old.get('resolved') else 'updated'
+        self.publish(event, {'incident': new})
+
+    @property
+    def last_id(self) -> int:
+        with self._condition:
+            return self._last_id
+
+    def events_since(self, last_id: int, timeout: float = 0):
+        """Events after `last_id`, waiting up to `timeout` seconds for one
+
+        Returns a list of (id, event, json data) tuples, or None when events
+        after `last_id` are no longer buffered and the client must refetch.
+        """
+        with self._condition:
+            if not 0 <= last_id <= self._last_id or (self._events and last_id < self._events[0][0] - 1):
+                return None
+            if last_id == self._last_id and timeout > 0:
+                self._condition.wait_for(lambda: self._last_id > last_id, timeout)
+            stale = self._insights_stale and self.insights is not None
+            self._insights_stale = False
+        if stale:
+            self.publish('insights', self.insights())
+        with self._condition:
+            return [e for e in self._events if e[0] > last_id]
+
+    def parse_event_id(self, value: Optional[str]) -> Optional[int]:
+        """Turn a Last-Event-ID header into a sequence number; -1 when it is from another process"""
+        if not value:
+            return None
+        epoch, _, number = value.partition('-')
+        if epoch != self._epoch or not number.isdigit():
+            return -1
+        return int(number)
+
+    def stream(self, last_event_id: Optional[str] = None, heartbeat: float = 15,
+               on_idle: Optional[Callable[[], None]] = None):
+        """Yield an SSE byte stream, resuming after `last_event_id` when given
+
+        A comment line is sent every `heartbeat` seconds without events so
+        proxies keep the connection open; `on_idle` runs at the same points
+        (the app uses it to pick up changes written by other processes).
+        """
+        with self._condition:
+            self.subscribers += 1
+        try:
+            yield b"retry: 3000\n\n"
+            last_id = self.parse_event_id(last_event_id)
+            if last_id is None:
+                last_id = self.last_id
+                if self.insights is not None:
+                    yield self._format(last_id, 'insights', serialization.dumps(self.insights()).decode('utf-8'))
+            while True:
+                events = self.events_since(last_id, heartbeat)
+                if events is None:
+                    last_id = self.last_id
+                    yield self._format(last_id, 'reset', '{}')
+                    continue
+                if not events:
+                    if on_idle is not None:
+                        on_idle()
+                    yield b": keepalive\n\n"
+                    continue
+                for event_id, event, payload in events:
+                    yield self._format(event_id, event, payload)
+                last_id = events[-1][0]
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+    def _format(self, event_id: int, event: str, payload: str) -> bytes:
+        return f"id: {self._epoch}-{event_id}\nevent: {event}\ndata: {payload}\n\n".encode()
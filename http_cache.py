@@ -0,0 +1,54 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResponseCache:
+    """Serialized response bodies keyed by request and data version
+
+    Read endpoints derive a strong ETag from the version of the data they
+    serve (the store's change counter, or a file fingerprint). A request
+    whose If-None-Match is current gets a 304 without any work, and a body
+    already serialized for the current ETag is reused as-is. Tags include a
+    per-process token because store versions are counted per process.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._token = None
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, *version) -> str:
+        """Strong entity tag for a data version"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked workers count versions independently, so they must not share tags
+                self._pid = os.getpid()
+                self._token = os.urandom(4).hex()
+                self._entries.clear()
+            token = self._token
+        return '-'.join([token] + [str(part) for part in version])
+
+    def get(self, key, etag: str) -> Optional[bytes]:
+        """The cached body for `key` if it was built for `etag`"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, etag: str, body: bytes):
+        """Remember the body built for `etag`, replacing older versions"""
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,210 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+
+def _process_alive(pid) -> bool:
+    """Whether a local process id is still running"""
+    if pid == os.getpid():
+        return True
+    if not isinstance(pid, int) or os.name == 'nt':
+        # Only the single-process servers run on Windows, so another pid is a previous run
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QueueFull(Exception):
+    """The analysis queue is at capacity"""
+
+
+class AnalysisQueue:
+    """Bounded background queue that runs AI analyses for stored incidents
+
+    Incidents are stored right away with analysis_status 'pending'; a pool
+    of worker threads analyses them and patches ai_analysis (and priority,
+    when the user did not set one) into the stored record. If the
+    description changes before a job runs, the job is superseded by the
+    newer one instead of writing a stale analysis. With zero workers
+    analyses run inline in the caller.
+
+    Jobs live in the memory of the process that queued them, so a job id
+    can only be looked up on that worker, and a worker that is recycled,
+    reloaded or crashes takes its queue with it. Each pending incident
+    therefore records the process that owns its analysis
+    (`analysis_request`); recover() re-queues the ones whose owner is gone.
+    """
+
+    def __init__(self, store, ai_processor, workers: int = 2, max_pending: int = 100,
+                 submit_timeout: float = 0.5, max_tracked_jobs: int = 1000, recover_interval: float = 60.0):
+        self.store = store
+        self.ai_processor = ai_processor
+        self.workers = workers
+        self.submit_timeout = submit_timeout
+        self.max_tracked_jobs = max_tracked_jobs
+        self.recover_interval = recover_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._next_recovery = (None, 0.0)
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'superseded': 0, 'rejected': 0,
+                         'recovered': 0}
+
+    def _ensure_workers(self):
+        # Threads do not survive a fork, so each process starts its own pool
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'analysis-worker-{n}', daemon=True)
+                for n in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    @staticmethod
+    def pending_fields(apply_priority: bool) -> Dict[str, Any]:
+        """Fields marking an incident as waiting for this process to analyse it"""
+        return {'analysis_status': 'pending',
+                'analysis_request': {'worker': os.getpid(), 'apply_priority': apply_priority}}
+
+    def recover(self):
+        """Re-queue analyses left pending by processes that no longer exist
+
+        Cheap to call on every request: the store is only scanned on a
+        process's first call and then every `recover_interval` seconds.
+        Each incident is claimed inside a store transaction, so two workers
+        never both take it over; one that finds no room in the queue is
+        marked failed, so it can be re-analysed later.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pid, due = self._next_recovery
+            if pid == os.getpid() and now < due:
+                return
+            self._next_recovery = (os.getpid(), now + self.recover_interval)
+        for incident in self.store.all():
+            if incident.get('analysis_status') != 'pending':
+                continue
+            request = incident.get('analysis_request') or {}
+            if _process_alive(request.get('worker')):
+                continue
+            with self.store.transaction():
+                current = self.store.get(incident['id'])
+                request = (current or {}).get('analysis_request') or {}
+                if current is None or current.get('analysis_status') != 'pending' or _process_alive(request.get('worker')):
+                    continue
+                apply_priority = bool(request.get('apply_priority'))
+                self.store.update(current['id'], self.pending_fields(apply_priority))
+            try:
+                self.submit(current['id'], current['description'], apply_priority)
+            except QueueFull:
+                self.store.update(current['id'], {'analysis_status': 'failed'})
+                continue
+            with self._lock:
+                self.counters['recovered'] += 1
+
+    def has_capacity(self) -> bool:
+        """Whether a new job would be accepted without waiting"""
+        return self.workers <= 0 or not self._queue.full()
+
+    def submit(self, incident_id: str, description: str, apply_priority: bool) -> Dict[str, Any]:
+        """Queue an analysis for a stored incident, raising QueueFull under backpressure"""
+        job = {
+            'id': str(uuid.uuid4()),
+            'incident_id': incident_id,
+            'status': 'queued',
+            'submitted_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': None,
+            'error': None
+        }
+        self._track(job)
+        work = (job, description, apply_priority)
+        if self.workers <= 0:
+            self._run(*work)
+            return dict(job)
+        self._ensure_workers()
+        try:
+            self._queue.put(work, timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self.counters['rejected'] += 1
+                self._jobs.pop(job['id'], None)
+            raise QueueFull('Analysis queue is full')
+        with self._lock:
+            self.counters['submitted'] += 1
+        return dict(job)
+
+    def _track(self, job: Dict[str, Any]):
+        with self._lock:
+            self._jobs[job['id']] = job
+            while len(self._jobs) > self.max_tracked_jobs:
+                self._jobs.popitem(last=False)
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, capacity and job counters"""
+        with self._lock:
+            return dict(self.counters, pending=self._queue.qsize(), capacity=self._queue.maxsize,
+                        workers=self.workers)
+
+    def _work(self):
+        while True:
+            job, description, apply_priority = self._queue.get()
+            try:
+                self._run(job, description, apply_priority)
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None):
+        with self._lock:
+            job['status'] = status
+            job['error'] = error
+            job['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.counters['completed' if status == 'done' else status] += 1
+
+    def _run(self, job: Dict[str, Any], description: str, apply_priority: bool):
+        with self._lock:
+            job['status'] = 'running'
+        try:
+            analysis = self.ai_processor.analyze_incident(description)
+        except Exception as e:
+            print(f"Background analysis error: {e}")
+            self._patch(job, description, {'analysis_status': 'failed'})
+            self._finish(job, 'failed', str(e))
+            return
+
+        changes = {'ai_analysis': analysis, 'analysis_status': 'complete'}
+        if apply_priority:
+            changes['priority'] = analysis.get('suggested_priority', 'Medium')
+        if self._patch(job, description, changes):
+            self._finish(job, 'done')
+        else:
+            self._finish(job, 'superseded')
+
+    def _patch(self, job: Dict[str, Any], description: str, changes: Dict[str, Any]) -> bool:
+        """Write results unless the incident was deleted or re-described meanwhile"""
+        with self.store.transaction():
+            incident = self.store.get(job['incident_id'])
+            if incident is None or incident.get('description') != description:
+                return False
+            self.store.update(job['incident_id'], changes)
+            return True
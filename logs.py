@@ -0,0 +1,149 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+from audit import format_entry
+
+# Lines that continue the previous entry, as written for description updates
+CONTINUATION_PREFIXES = (b'From: ', b'To: ')
+
+
+class LogReader:
+    """Random-access reader for the action log
+
+    The log holds JSON-lines records from AuditLogger and, in older logs,
+    plain text lines; both come back as display strings. Entries are
+    addressed by the byte offset where they start. tail()
+    seeks backwards from the end (or from a cursor offset) and since()
+    reads forwards from an offset, so either costs time proportional to
+    the entries returned rather than to the size of the log. Multi-line
+    entries ("From: ... To: ..." updates) come back as one record.
+    """
+
+    BLOCK_SIZE = 8192
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def _is_continuation(line: bytes) -> bool:
+        return line.startswith(CONTINUATION_PREFIXES)
+
+    @staticmethod
+    def _record(lines: List[bytes]) -> str:
+        if len(lines) == 1 and lines[0].startswith(b'{'):
+            try:
+                return format_entry(json.loads(lines[0]))
+            except (ValueError, AttributeError):
+                pass
+        return '\n'.join(line.decode('utf-8', errors='replace').strip() for line in lines)
+
+    def size(self) -> int:
+        """Offset just past the last complete line"""
+        try:
+            with open(self.path, 'rb') as f:
+                end = f.seek(0, os.SEEK_END)
+                if end == 0:
+                    return 0
+                f.seek(end - 1)
+                if f.read(1) == b'\n':
+                    return end
+                # A line still being written: stop before it
+                for offset, _ in self._reverse_lines(f, end):
+                    return offset
+                return 0
+        except FileNotFoundError:
+            return 0
+
+    def _reverse_lines(self, f, end: int):
+        """Yield (offset, line) pairs from `end` backwards, skipping blank lines"""
+        position = end
+        buffer = b''
+        while position > 0:
+            size = min(self.BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            buffer = f.read(size) + buffer
+            lines = buffer.split(b'\n')
+            # The first piece may continue in the previous block
+            buffer = lines[0]
+            offset = position + len(buffer) + 1
+            located = []
+            for line in lines[1:]:
+                located.append((offset, line))
+                offset += len(line) + 1
+            for line_offset, line in reversed(located):
+                if line.strip():
+                    yield line_offset, line
+        if buffer.strip():
+            yield 0, buffer
+
+    def tail(self, count: int, before: Optional[int] = None) -> Tuple[List[str], Optional[int], int]:
+        """The last `count` entries before offset `before` (default: end of log)
+
+        Returns the entries oldest first, the offset of the first one (a
+        cursor for the page before it, or None at the start of the log) and
+        the end offset for since().
+        """
+        end = self.size()
+        if before is None or before > end:
+            before = end
+        entries = []
+        pending = []
+        start = 0
+        if count > 0 and before > 0:
+            with open(self.path, 'rb') as f:
+                for offset, line in self._reverse_lines(f, before):
+                    pending.append(line)
+                    if self._is_continuation(line):
+                        continue
+                    entries.append(self._record(list(reversed(pending))))
+                    pending = []
+                    start = offset
+                    if len(entries) == count:
+                        break
+            if pending:
+                # Continuation lines with nothing before them: show them as their own entry
+                entries.append(self._record(list(reversed(pending))))
+                start = 0
+        entries.reverse()
+        return entries, (start if start > 0 else None), end
+
+    def since(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[str], int]:
+        """Entries starting at `offset`, up to `limit` of them
+
+        Returns the entries and the offset to continue from. An offset past
+        the end (the log was replaced) starts again from the beginning.
+        """
+        end = self.size()
+        if offset > end:
+            offset = 0
+        entries = []
+        current = []
+        position = offset
+        next_offset = offset
+        if offset < end:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                while position < end:
+                    line = f.readline()
+                    line_start, position = position, position + len(line)
+                    line = line.rstrip(b'\n')
+                    if not line.strip():
+                        continue
+                    if current and not self._is_continuation(line):
+                        entries.append(self._record(current))
+                        current = []
+                        next_offset = line_start
+                        if limit is not None and len(entries) >= limit:
+                            break
+                    current.append(line)
+                else:
+                    if current:
+                        entries.append(self._record(current))
+                    next_offset = end
+        return entries, next_offset
+
+    def all(self) -> List[str]:
+        """Every entry, oldest first"""
+        return self.since(0)[0]
@@ -0,0 +1,143 @@
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_HEADER = 'X-Profile-Token'
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+
+class RequestProfiler:
+    """Opt-in cProfile captures of individual requests
+
+    A request is profiled when it carries the PROFILE_TOKEN in an
+    X-Profile-Token header, or when it is the Nth since the last sampled
+    one (`sample_rate`, 0 for never). The profile is saved to `directory`
+    as <id>_<method>_<route>_<ms>ms.prof and only the newest `keep`
+    captures are kept. One request is profiled at a time per process;
+    others arriving meanwhile run unprofiled. wrap() installs the hook
+    around a WSGI app: the app only calls it when profiling is enabled,
+    so requests pay nothing otherwise.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, token: str = '', sample_rate: int = 0, keep: int = 50):
+        self.directory = os.path.abspath(directory)
+        self.token = token
+        self.sample_rate = sample_rate
+        self.keep = max(keep, 1)
+        self._counter = itertools.count(1)
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        """Profiler configured from PROFILE_* environment variables"""
+        return cls(
+            PROFILE_DIR,
+            token=os.getenv('PROFILE_TOKEN', ''),
+            sample_rate=int(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+            keep=int(os.getenv('PROFILE_KEEP', '50'))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """Whether `token` is the configured one (never true when none is set)"""
+        return bool(self.token) and bool(token) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def _wanted(self, environ) -> bool:
+        if environ.get('PATH_INFO', '').startswith('/admin/profiles'):
+            return False
+        if self.authorized(environ.get('HTTP_X_PROFILE_TOKEN')):
+            return True
+        return self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0
+
+    def wrap(self, wsgi_app):
+        """`wsgi_app` with the profiling hook (to the first byte for streamed responses)"""
+        def profiled(environ, start_response):
+            if not self._wanted(environ) or not self._active.acquire(blocking=False):
+                return wsgi_app(environ, start_response)
+            capture_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+
+            def add_header(status, headers, exc_info=None):
+                return start_response(status, list(headers) + [('X-Profile-Id', capture_id)], exc_info)
+
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                profile.enable()
+                try:
+                    return wsgi_app(environ, add_header)
+                finally:
+                    profile.disable()
+            finally:
+                self._active.release()
+                try:
+                    self._save(profile, capture_id, environ, time.perf_counter() - start)
+                except Exception as e:
+                    print(f"Error saving request profile: {e}")
+        return profiled
+
+    def _save(self, profile: cProfile.Profile, capture_id: str, environ, seconds: float):
+        route = re.sub(r'[^A-Za-z0-9.-]+', '-', environ.get('PATH_INFO', '').strip('/'))[:80] or 'root'
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{capture_id}_{environ.get('REQUEST_METHOD', '')}_{route}_{round(seconds * 1000)}ms.prof"
+        profile.dump_stats(os.path.join(self.directory, name))
+        # Names start with the capture time, so they sort oldest first
+        files = self._files()
+        for old in files[:max(len(files) - self.keep, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass  # Another worker rotated it first
+
+    def _files(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith('.prof'))
+        except FileNotFoundError:
+            return []
+
+    def captures(self) -> List[Dict[str, Any]]:
+        """Saved captures, newest first"""
+        captures = []
+        for name in reversed(self._files()):
+            try:
+                capture_id, method, rest = name[:-len('.prof')].split('_', 2)
+                route, duration = rest.rsplit('_', 1)
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except (ValueError, OSError):
+                continue
+            captures.append({
+                'id': capture_id,
+                'method': method,
+                'route': route,
+                'duration_ms': int(duration[:-2]) if duration[:-2].isdigit() else None,
+                'size': size,
+                'file': name
+            })
+        return captures
+
+    def path(self, capture_id: str) -> Optional[str]:
+        """The saved profile for a capture id"""
+        for name in self._files():
+            if name.split('_', 1)[0] == capture_id:
+                return os.path.join(self.directory, name)
+        return None
+
+    def report(self, capture_id: str, sort: str = 'cumulative', limit: int = 50) -> Optional[str]:
+        """pstats text report of a capture, top `limit` functions by `sort`"""
+        path = self.path(capture_id)
+        if path is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
@@ -1,9 +1,9 @@
-import json
-import os
 import uuid
 from datetime import datetime
 from colorama import Fore, Style, init
 from ai_processor import AIProcessor
+from audit import AuditLogger, LOG_FILE
+from storage import IncidentStore, open_backend, INCIDENT_FILE
 
 # Initialize colorama for Windows support
 init()
@@ -12,28 +12,24 @@ class IncidentManager:
     """Command-line incident management system"""
     
     def __init__(self):
-        self.INCIDENT_FILE = 'incidents.json'
-        self.LOG_FILE = 'incident_log.txt'
+        self.INCIDENT_FILE = INCIDENT_FILE
+        self.LOG_FILE = LOG_FILE
+        self.audit_log = AuditLogger.from_env(self.LOG_FILE, source='cli')
+        self.store = IncidentStore(open_backend())
         self.incidents = self.load_incidents()
         self.ai_processor = AIProcessor()
     
     def load_incidents(self):
-        """Load incidents from JSON file"""
-        if os.path.exists(self.INCIDENT_FILE):
-            with open(self.INCIDENT_FILE, 'r') as f:
-                return json.load(f)
-        return []
+        """Load incidents from the configured storage backend"""
+        return self.store.all()
     
     def save_incidents(self):
-        """Save incidents to JSON file"""
-        with open(self.INCIDENT_FILE, 'w') as f:
-            json.dump(self.incidents, f, indent=2)
+        """Save incidents through the configured storage backend"""
+        self.store.replace_all(self.incidents)
     
     def log_action(self, action):
-        """Log actions to file"""
-        with open(self.LOG_FILE, 'a') as f:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            f.write(f"[{timestamp}] {action}\n")
+        """Log actions to the shared audit log"""
+        self.audit_log.log(action)
     
     def create_incident(self):
         """Create a new incident"""
@@ -73,8 +69,8 @@ class IncidentManager:
             'ai_analysis': ai_analysis
         }
         
-        self.incidents.append(incident)
-        self.save_incidents()
+        self.store.add(incident)
+        self.incidents = self.load_incidents()
         
         ai_suffix = ' (with AI analysis)' if use_ai else ''
         self.log_action(f"Incident created{ai_suffix}: {description}")
@@ -94,7 +90,7 @@ class IncidentManager:
         
         incident_id = input("Enter ID of incident to update: ").strip()
         
-        incident = next((i for i in self.incidents if i['id'] == incident_id), None)
+        incident = self.store.get(incident_id)
         if not incident:
             print(f"{Fore.RED}Incident not found!{Style.RESET_ALL}")
             return
@@ -102,20 +98,24 @@ class IncidentManager:
         new_desc = input("Enter new description: ").strip()
         if new_desc:
             old_desc = incident['description']
-            incident['description'] = new_desc
+            changes = {'description': new_desc}
             
             # Ask if user wants to re-run AI analysis
             if incident.get('ai_analysis'):
                 reanalyze = input("Re-run AI analysis with new description? [y/N]: ").strip().lower()
                 if reanalyze in ['y', 'yes']:
                     print("Re-analyzing with AI...")
-                    incident['ai_analysis'] = self.ai_processor.analyze_incident(new_desc)
+                    changes['ai_analysis'] = self.ai_processor.analyze_incident(new_desc)
                     print(f"{Fore.CYAN}Updated AI Analysis:{Style.RESET_ALL}")
-                    print(f"  Priority: {incident['ai_analysis'].get('suggested_priority', 'Medium')}")
-                    print(f"  Category: {incident['ai_analysis'].get('category', 'Unknown')}")
-                    print(f"  Risk Level: {incident['ai_analysis'].get('risk_level', 'Medium')}")
+                    print(f"  Priority: {changes['ai_analysis'].get('suggested_priority', 'Medium')}")
+                    print(f"  Category: {changes['ai_analysis'].get('category', 'Unknown')}")
+                    print(f"  Risk Level: {changes['ai_analysis'].get('risk_level', 'Medium')}")
             
-            self.save_incidents()
+            # Only the changed fields are written, so edits made meanwhile by the web app survive
+            if not self.store.update(incident_id, changes):
+                print(f"{Fore.RED}Incident not found!{Style.RESET_ALL}")
+                return
+            self.incidents = self.load_incidents()
             self.log_action(f"Incident updated:\nFrom: {old_desc}\nTo: {new_desc}")
             print(f"{Fore.GREEN}Incident updated successfully!{Style.RESET_ALL}")
     
@@ -127,14 +127,15 @@ class IncidentManager:
         
         incident_id = input("Enter ID of incident to resolve: ").strip()
         
-        incident = next((i for i in self.incidents if i['id'] == incident_id), None)
+        incident = self.store.update(incident_id, {
+            'resolved': True,
+            'resolved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
         if not incident:
             print(f"{Fore.RED}Incident not found!{Style.RESET_ALL}")
             return
         
-        incident['resolved'] = True
-        incident['resolved_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.save_incidents()
+        self.incidents = self.load_incidents()
         self.log_action(f"Incident resolved: {incident['description']}")
         print(f"{Fore.GREEN}Incident resolved!{Style.RESET_ALL}")
     
@@ -146,13 +147,12 @@ class IncidentManager:
         
         incident_id = input("Enter ID of incident to delete: ").strip()
         
-        incident_index = next((i for i, inc in enumerate(self.incidents) if inc['id'] == incident_id), None)
-        if incident_index is None:
+        deleted = self.store.delete(incident_id)
+        if deleted is None:
             print(f"{Fore.RED}Incident not found!{Style.RESET_ALL}")
             return
         
-        deleted = self.incidents.pop(incident_index)
-        self.save_incidents()
+        self.incidents = self.load_incidents()
         self.log_action(f"Incident deleted: {deleted['description']}")
         print(f"{Fore.GREEN}Incident deleted!{Style.RESET_ALL}")
     
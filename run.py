@@ -2,13 +2,130 @@
 """
 Run script for AI-Enhanced Incident Response System (Python Version)
 Provides options to start either the web server or CLI interface
+
+    python run.py            interactive menu (development server or CLI)
+    python run.py serve      production server: preforked workers with threads
+    python run.py reload     replace a running production server without dropping requests
 """
 
+import argparse
+import gc
+import os
+import signal
 import sys
 import subprocess
-import os
+import time
 
-def main():
+WEB_BIND = os.getenv('WEB_BIND', '127.0.0.1:4506')
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', str(min(2 * (os.cpu_count() or 1) + 1, 8))))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '16'))
+WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', '10000'))
+WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+WEB_PIDFILE = os.getenv('WEB_PIDFILE', 'incident-server.pid')
+
+# Every open /events stream holds one worker thread for as long as the dashboard is open
+MIN_THREADS = 2
+RECOMMENDED_THREADS = 8
+
+
+def server_options(bind=WEB_BIND, workers=WEB_WORKERS, threads=WEB_THREADS, max_requests=WEB_MAX_REQUESTS,
+                   graceful_timeout=WEB_GRACEFUL_TIMEOUT, pidfile=WEB_PIDFILE):
+    """Gunicorn settings for the production server"""
+    if threads < MIN_THREADS:
+        # A sync worker serving one /events stream could serve nothing else until the dashboard closes
+        raise ValueError(f"threads must be at least {MIN_THREADS}: each /events stream holds a thread")
+    return {
+        'bind': bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        # The app (store, AI processor, indexes) is built once in the master and inherited by every worker
+        'preload_app': True,
+        # Recycle each worker after this many requests, staggered so they do not all restart together
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'graceful_timeout': graceful_timeout,
+        'pidfile': pidfile,
+        'proc_name': 'incident-response',
+    }
+
+
+def load_application():
+    """Import the Flask app in the master process, ready to be shared with forked workers
+
+    Background threads, SQLite connections and HTTP sessions all start
+    lazily per process, so nothing created here leaks into a worker.
+    Freezing the garbage collector after the import keeps collections in
+    the workers from writing to the shared objects and un-sharing their
+    copy-on-write pages.
+    """
+    from app import app
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def serve(options):
+    """Run the production server, or the threaded Werkzeug server where gunicorn is unavailable"""
+    if options['threads'] < RECOMMENDED_THREADS:
+        print(f"Warning: {options['threads']} threads per worker; every open dashboard holds one through its "
+              f"/events stream, so a few dashboards can leave no thread for other requests.")
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is not installed (pip install -r requirements.txt; it does not run on Windows).")
+        print("Falling back to the single-process threaded Werkzeug server.")
+        host, _, port = options['bind'].rpartition(':')
+        load_application().run(host=host or '127.0.0.1', port=int(port), threaded=True, debug=False)
+        return
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_application()
+
+    print(f"Starting production server on http://{options['bind']} "
+          f"({options['workers']} workers x {options['threads']} threads)")
+    ProductionServer().run()
+
+
+def reload_server(pidfile=WEB_PIDFILE, timeout=60):
+    """Start a new server with the current code, then gracefully stop the old one
+
+    USR2 makes the running master start a new master (re-importing the
+    app) that shares the listening socket and writes `<pidfile>.2`. Once
+    it is up, TERM lets the old workers finish in-flight requests and
+    exit, and the new master takes over the pidfile. Connections are
+    accepted throughout.
+    """
+    try:
+        with open(pidfile) as f:
+            old_pid = int(f.read().strip())
+    except (OSError, ValueError):
+        print(f"No running server found ({pidfile} is missing or unreadable)")
+        return False
+
+    os.kill(old_pid, signal.SIGUSR2)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        try:
+            with open(pidfile + '.2') as f:
+                new_pid = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if new_pid != old_pid:
+            os.kill(old_pid, signal.SIGTERM)
+            print(f"Reloaded: server {new_pid} replaced {old_pid}")
+            return True
+    print(f"The new server did not start within {timeout}s; {old_pid} is still serving")
+    return False
+
+
+def menu():
     print("AI-Enhanced Incident Response System (Python Version)")
     print("=" * 55)
     print("\nChoose an option:")
@@ -47,5 +164,33 @@ def main():
             print(f"Error: {e}")
             sys.exit(1)
 
+def main():
+    parser = argparse.ArgumentParser(description='Start the incident response system')
+    commands = parser.add_subparsers(dest='command')
+    serve_parser = commands.add_parser('serve', help='production server (gunicorn, preloaded, multi-worker)')
+    serve_parser.add_argument('--bind', default=WEB_BIND, help='host:port to listen on')
+    serve_parser.add_argument('--workers', type=int, default=WEB_WORKERS, help='worker processes')
+    serve_parser.add_argument('--threads', type=int, default=WEB_THREADS, help='threads per worker')
+    serve_parser.add_argument('--max-requests', type=int, default=WEB_MAX_REQUESTS,
+                              help='recycle a worker after this many requests (0 never)')
+    serve_parser.add_argument('--graceful-timeout', type=int, default=WEB_GRACEFUL_TIMEOUT,
+                              help='seconds a stopping worker gets to finish its requests')
+    serve_parser.add_argument('--pidfile', default=WEB_PIDFILE, help='master process id file')
+    reload_parser = commands.add_parser('reload', help='replace a running production server with the current code')
+    reload_parser.add_argument('--pidfile', default=WEB_PIDFILE, help='master process id file')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        try:
+            options = server_options(args.bind, args.workers, args.threads, args.max_requests,
+                                     args.graceful_timeout, args.pidfile)
+        except ValueError as e:
+            parser.error(str(e))
+        serve(options)
+    elif args.command == 'reload':
+        sys.exit(0 if reload_server(args.pidfile) else 1)
+    else:
+        menu()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
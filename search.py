@@ -0,0 +1,263 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import reduce
+from typing import Dict, List, Any, Optional, Tuple
+
+# Words and numbers; hostnames and addresses ("web-01.example.com", "10.0.0.5") are indexed by their parts
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased search terms of a text"""
+    return WORD_PATTERN.findall((text or '').lower())
+
+
+class SearchIndex:
+    """In-memory inverted index over incident descriptions and response steps
+
+    Maps each term to the incidents containing it, in creation order, with
+    how often it occurs; incidents where a term occurs more than once are
+    also grouped by that count. A sorted term list answers prefix lookups
+    with a binary search. Hostnames and IPs are indexed by their parts, so
+    "db-02.corp" finds incidents mentioning db, 02 and corp. Attach it to an
+    IncidentStore with `add_listener`: it is built from the loaded
+    incidents and then kept up to date as incidents are created, updated
+    and deleted.
+
+    Every query word must match. Whole words match exactly; the last word,
+    unless the query ends with a space, also matches as a prefix, so
+    results follow what is being typed. Results are ranked by term
+    frequency (sum of 1 + log tf) plus a recency bonus of up to
+    `recency_weight` that halves every `recency_days` days, so recency
+    mostly breaks ties.
+    """
+
+    MIN_PREFIX_LENGTH = 2
+    # Incidents scored before the walk: up to PRESCORE_FACTOR * limit + PRESCORE_MIN
+    PRESCORE_FACTOR = 4
+    PRESCORE_MIN = 256
+
+    def __init__(self, recency_days: float = 30.0, recency_weight: float = 0.5):
+        self.recency_days = recency_days
+        self.recency_weight = recency_weight
+        self._lock = threading.Lock()
+        self.reset()
+
+    @staticmethod
+    def _document_terms(incident: Dict[str, Any]) -> Counter:
+        texts = [incident.get('description') or '']
+        analysis = incident.get('ai_analysis')
+        if analysis:
+            texts.extend(step for step in analysis.get('response_steps') or [] if isinstance(step, str))
+        return Counter(WORD_PATTERN.findall('\n'.join(texts).lower()))
+
+    @staticmethod
+    def _created(incident: Dict[str, Any]) -> float:
+        try:
+            return datetime.fromisoformat(incident['created_at']).timestamp()
+        except (ValueError, KeyError, TypeError):
+            return 0.0
+
+    # Store listener protocol
+
+    def reset(self, incidents: Optional[List[Dict[str, Any]]] = None):
+        """Rebuild the index from scratch"""
+        with self._lock:
+            self._postings: Dict[str, Dict[str, int]] = {}
+            self._by_frequency: Dict[str, Dict[int, set]] = {}
+            self._documents: Dict[str, Tuple[Counter, float]] = {}
+            self._terms: List[str] = []
+            # Oldest first, so every postings dict starts out in creation order
+            for incident in sorted(incidents or [], key=self._created):
+                self._add(incident, bulk=True)
+            self._terms = sorted(self._postings)
+
+    def add(self, incident: Dict[str, Any]):
+        with self._lock:
+            self._add(incident)
+
+    def remove(self, incident: Dict[str, Any]):
+        with self._lock:
+            self._remove(incident['id'])
+
+    def update(self, old: Dict[str, Any], new: Dict[str, Any]):
+        with self._lock:
+            if self._document_terms(new) == self._documents.get(old['id'], (None,))[0]:
+                # Resolving an incident, say, leaves its text alone
+                return
+            self._remove(old['id'])
+            self._add(new)
+
+    def _add(self, incident: Dict[str, Any], bulk: bool = False):
+        incident_id = incident['id']
+        terms = self._document_terms(incident)
+        created = self._created(incident)
+        self._documents[incident_id] = (terms, created)
+        for term, count in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if not bulk:
+                    bisect.insort(self._terms, term)
+            newest = None if bulk else next(reversed(postings), None)
+            postings[incident_id] = count
+            if newest is not None and self._documents[newest][1] > created:
+                # Rare (an old incident imported or re-described): restore creation order
+                self._postings[term] = dict(sorted(postings.items(), key=lambda item: self._documents[item[0]][1]))
+            if count > 1:
+                self._by_frequency.setdefault(term, {}).setdefault(count, set()).add(incident_id)
+
+    def _remove(self, incident_id: str):
+        document = self._documents.pop(incident_id, None)
+        if document is None:
+            return
+        for term, count in document[0].items():
+            postings = self._postings[term]
+            del postings[incident_id]
+            if count > 1:
+                levels = self._by_frequency[term]
+                levels[count].discard(incident_id)
+                if not levels[count]:
+                    del levels[count]
+                    if not levels:
+                        del self._by_frequency[term]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Every indexed term starting with `prefix`"""
+        start = bisect.bisect_left(self._terms, prefix)
+        # '{' sorts after every character a term can contain
+        return self._terms[start:bisect.bisect_left(self._terms, prefix + '{', start)]
+
+    def _levels(self, terms: List[str]) -> List[Tuple[int, set]]:
+        """(tf, ids) for the incidents where one of `terms` occurs more than once"""
+        return [level for term in terms for level in self._by_frequency.get(term, {}).items()]
+
+    @staticmethod
+    def _matches(required: List[Any]):
+        """Incidents in every one of `required` (postings or id sets)
+
+        Chained filters over the smallest run the membership tests in C.
+        """
+        required = sorted(required, key=len)
+        if len(required) == 1:
+            return required[0]
+        return set(reduce(lambda ids, postings: filter(postings.__contains__, ids), required[1:], iter(required[0])))
+
+    def search(self, query: str, limit: int = 20) -> Tuple[List[Tuple[str, float]], int]:
+        """Best matches for `query`: ([(incident id, score)], total matches)
+
+        A prefix's expansions are merged into one set of ids, so matching
+        costs the size of their postings however many terms the prefix
+        covers. Ranking walks the matches newest first and stops once no
+        older incident could still outscore the current top `limit`: its
+        frequency score can be at most that of the highest tf left unscored,
+        and its recency bonus only shrinks. The few incidents in small tf
+        groups are scored up front, so the bound is usually just one point
+        per word. When the matches are a small share of the postings walked,
+        they are all scored instead.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return [], 0
+        words = list(dict.fromkeys(tokens))
+        prefix = None
+        last = tokens[-1]
+        if WORD_PATTERN.fullmatch(query[-1:].lower()) and len(last) >= self.MIN_PREFIX_LENGTH and last not in tokens[:-1]:
+            prefix = last
+        with self._lock:
+            expansions = [self._expand(word) if word == prefix else [word] if word in self._postings else []
+                          for word in words]
+            if not all(expansions):
+                return [], 0
+            exact = sorted((self._postings[terms[0]] for terms in expansions if len(terms) == 1), key=len)
+            partial = [self._postings[term] for terms in expansions if len(terms) > 1 for term in terms]
+            matched = self._matches(exact + [set().union(*partial)] if partial else exact)
+            total = len(matched)
+            if not total:
+                return [], 0
+
+            documents = self._documents
+            now = time.time()
+            half_life = self.recency_days * 86400
+            weight = self.recency_weight
+
+            def frequency(incident_id):
+                score = sum(1 + math.log(postings[incident_id]) for postings in exact)
+                if partial:
+                    # The prefix scores its best-matching term in this incident
+                    score += 1 + math.log(max(count for term, count in documents[incident_id][0].items()
+                                              if term.startswith(prefix)))
+                return score
+
+            def bonus(created):
+                return weight * 0.5 ** (max(now - created, 0) / half_life)
+
+            best = []  # Min-heap of the top `limit` (score, id)
+
+            def offer(score, incident_id):
+                if len(best) < limit:
+                    heapq.heappush(best, (score, incident_id))
+                elif (score, incident_id) > best[0]:
+                    heapq.heapreplace(best, (score, incident_id))
+
+            # Incidents in small tf groups are scored now; the rest bound what an unwalked incident can score
+            budget = self.PRESCORE_FACTOR * limit + self.PRESCORE_MIN
+            prescored = set()
+            repeated = []  # The other tf groups
+            bound = 0.0
+            for terms in expansions:
+                highest = 1
+                for count, ids in sorted(self._levels(terms), key=lambda level: len(level[1])):
+                    if budget < len(ids) and len(ids) * total <= 4 * budget * len(documents):
+                        # Few of them are likely to match
+                        ids = set(filter(matched.__contains__, ids))
+                    if len(ids) <= budget:
+                        budget -= len(ids)
+                        prescored.update(ids)
+                    else:
+                        highest = max(highest, count)
+                        repeated.append(ids)
+                bound += 1 + math.log(highest)
+            for incident_id in prescored:
+                if incident_id in matched:
+                    offer(frequency(incident_id) + bonus(documents[incident_id][1]), incident_id)
+
+            def score(incident_id, created):
+                if any(incident_id in ids for ids in repeated):
+                    return frequency(incident_id) + bonus(created)
+                return len(words) + bonus(created)
+
+            # A walk reaches about limit * size / total incidents before enough match
+            size = len(exact[0]) if exact else sum(map(len, partial))
+            if total * total <= limit * size:
+                for incident_id in matched:
+                    if incident_id not in prescored:
+                        offer(score(incident_id, documents[incident_id][1]), incident_id)
+            else:
+                if exact:
+                    walk = reversed(exact[0])
+                else:
+                    walk = heapq.merge(*(reversed(p) for p in partial), reverse=True, key=lambda i: documents[i][1])
+                walked = set(prescored)  # An incident can be in more than one expansion
+                for incident_id in walk:
+                    created = documents[incident_id][1]
+                    if len(best) == limit and best[0][0] >= bound + bonus(created):
+                        break
+                    if incident_id not in walked and incident_id in matched:
+                        walked.add(incident_id)
+                        offer(score(incident_id, created), incident_id)
+
+            return [(incident_id, round(value, 4)) for value, incident_id in sorted(best, reverse=True)], total
@@ -0,0 +1,66 @@
+import json
+import os
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibSerializer:
+    """Compact JSON through the standard library"""
+
+    name = 'json'
+
+    def dumps(self, obj: Any, default: Optional[Callable] = None, sort_keys: bool = False) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=default,
+                          sort_keys=sort_keys).encode('utf-8')
+
+    def loads(self, data) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """JSON through orjson, several times faster than the standard library
+
+    Dates and times go to `default` like they do with the stdlib, so both
+    serializers produce the same output.
+    """
+
+    name = 'orjson'
+
+    def dumps(self, obj: Any, default: Optional[Callable] = None, sort_keys: bool = False) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+
+    def loads(self, data) -> Any:
+        return orjson.loads(data)
+
+
+def get_serializer(name: Optional[str] = None):
+    """The named serializer ('orjson' or 'json'); by default orjson when it is installed"""
+    name = (name or 'auto').lower()
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+        return OrjsonSerializer()
+    if name in ('json', 'auto'):
+        return StdlibSerializer()
+    raise ValueError(f"Unknown JSON serializer: {name}")
+
+
+# The serializer used for storage files and responses; JSON_SERIALIZER=json forces the stdlib
+serializer = get_serializer(os.getenv('JSON_SERIALIZER'))
+
+
+def dumps(obj: Any, default: Optional[Callable] = None) -> bytes:
+    """Compact UTF-8 JSON bytes"""
+    return serializer.dumps(obj, default=default)
+
+
+def loads(data) -> Any:
+    """Parse JSON from bytes or str"""
+    return serializer.loads(data)
@@ -1,6 +1,7 @@
 from flask import Flask, jsonify
 from ai_processor import AIProcessor
-import json
+from audit import LOG_FILE
+from storage import IncidentStore, open_backend, STORAGE_BACKEND
 import os
 import sys
 
@@ -16,15 +17,15 @@ def status():
         ai_status = "OK" if 'suggested_priority' in ai_test else "ERROR"
         
         # Check files
-        incidents_exist = os.path.exists('incidents.json')
-        logs_exist = os.path.exists('incident_log.txt')
+        backend = open_backend()
+        storage_file = getattr(backend, 'db_file', None) or getattr(backend, 'snapshot_file', None)
+        incidents_exist = os.path.exists(storage_file)
+        logs_exist = os.path.exists(LOG_FILE)
         
-        # Test incidents loading
+        # Test incidents loading through the configured backend (journal or SQLite), as the app does
         incidents = []
         try:
-            if incidents_exist:
-                with open('incidents.json', 'r') as f:
-                    incidents = json.load(f)
+            incidents = IncidentStore(backend).all()
             incidents_status = "OK"
         except Exception as e:
             incidents_status = f"ERROR: {e}"
@@ -32,6 +33,7 @@ def status():
         return jsonify({
             'status': 'OK',
             'ai_processor': ai_status,
+            'storage_backend': STORAGE_BACKEND,
             'incidents_file': 'EXISTS' if incidents_exist else 'NOT_FOUND',
             'logs_file': 'EXISTS' if logs_exist else 'NOT_FOUND', 
             'incidents_count': len(incidents),
@@ -0,0 +1,815 @@
+import argparse
+import heapq
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+
+import serialization
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Backend selection, shared by app.py and project.py
+STORAGE_BACKEND = os.getenv('INCIDENT_STORAGE', 'json')
+INCIDENT_FILE = os.getenv('INCIDENT_FILE', 'incidents.json')
+INCIDENT_DB = os.getenv('INCIDENT_DB', 'incidents.db')
+LOCK_TIMEOUT = float(os.getenv('INCIDENT_LOCK_TIMEOUT', '10'))
+
+
+class StorageLockTimeout(TimeoutError):
+    """Raised when the storage lock could not be acquired in time"""
+
+
+def _file_signature(path: str):
+    """Identity of a file's current contents: inode, mtime and size"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class FileLock:
+    """Re-entrant advisory lock shared between threads and processes
+
+    Uses fcntl.flock on a sidecar lock file. Readers take the lock shared so
+    they never wait on each other, only on a writer; writers take it
+    exclusive. Waiting is bounded by `timeout`, after which
+    StorageLockTimeout is raised instead of hanging the request.
+    """
+
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+
+    def shared(self):
+        """Hold the lock for reading"""
+        return self._hold(exclusive=False)
+
+    def exclusive(self):
+        """Hold the lock for a read-modify-write cycle"""
+        return self._hold(exclusive=True)
+
+    @contextmanager
+    def _hold(self, exclusive: bool):
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise StorageLockTimeout(f"Timed out waiting for {self.path}")
+        try:
+            if self._depth == 0:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    self._flock(exclusive, deadline)
+                except BaseException:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                # Upgrade a shared hold; it stays exclusive until fully released
+                self._flock(True, deadline)
+                self._exclusive = True
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    if fcntl is not None:
+                        fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    os.close(self._fd)
+                    self._fd = None
+        finally:
+            self._thread_lock.release()
+
+    def _flock(self, exclusive: bool, deadline: float):
+        if fcntl is None:
+            return
+        mode = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        while True:
+            try:
+                fcntl.flock(self._fd, mode)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise StorageLockTimeout(f"Timed out waiting for {self.path}")
+                time.sleep(0.002)
+
+
+class IncidentJournal:
+    """JSON storage backend: a snapshot file plus an append-only change journal
+
+    Every change is appended to the journal as one compact JSON record, so a
+    create or update costs one short write instead of a full rewrite of the
+    snapshot. The journal is replayed over the snapshot on load and folded
+    back into the snapshot in the background once it grows past a threshold.
+    The snapshot keeps the plain list format of incidents.json so existing
+    readers keep working.
+    """
+
+    def __init__(self, snapshot_file: str = 'incidents.json', journal_file: Optional[str] = None,
+                 max_journal_bytes: int = 4 * 1024 * 1024, max_journal_records: int = 1000):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file or os.path.splitext(snapshot_file)[0] + '.journal'
+        self.max_journal_bytes = max_journal_bytes
+        self.max_journal_records = max_journal_records
+        self._file_lock = FileLock(snapshot_file + '.lock')
+        self._lock = threading.Lock()
+        self._journal_records = None
+        self._compacting = False
+        # (old snapshot signature, journal bytes folded in, new snapshot signature) of this process's last compaction
+        self._folded = None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load the snapshot and replay the journal over it"""
+        incidents, _ = self.load_state()
+        return list(incidents.values())
+
+    def transaction(self):
+        """Exclusive lock held around a read-modify-write cycle"""
+        return self._file_lock.exclusive()
+
+    def load_state(self):
+        """Load the id -> incident mapping and the position it reflects"""
+        with self._file_lock.shared():
+            snapshot_sig = _file_signature(self.snapshot_file)
+            incidents = {}
+            if snapshot_sig is not None:
+                with open(self.snapshot_file, 'rb') as f:
+                    for incident in serialization.loads(f.read()):
+                        incidents[incident['id']] = incident
+            records, offset = self.read_records()
+        for record in records:
+            self.apply(incidents, record)
+        self._journal_records = len(records)
+        return incidents, (snapshot_sig, offset)
+
+    def signature(self):
+        """Cheap token that changes whenever the stored data changes"""
+        return (_file_signature(self.snapshot_file), _file_signature(self.journal_file))
+
+    def changes_since(self, position):
+        """Journal records written after `position`, or None if a full reload is needed
+
+        A snapshot rewritten by this process's own compaction does not need
+        a reload: the records it folded in past `position` are still at
+        hand, and the new journal follows on from them.
+        """
+        snapshot_sig, offset = position
+        folded_records = []
+        with self._file_lock.shared():
+            current_sig = _file_signature(self.snapshot_file)
+            if current_sig != snapshot_sig:
+                folded = self._folded
+                if folded is None or folded[0] != snapshot_sig or folded[2] != current_sig or offset > len(folded[1]):
+                    return None
+                folded_records = self.parse_records(folded[1][offset:])
+                snapshot_sig, offset = current_sig, 0
+            journal_sig = _file_signature(self.journal_file)
+            if journal_sig is None or journal_sig[2] < offset:
+                return None
+            records, offset = self.read_records(offset)
+        return folded_records + records, (snapshot_sig, offset)
+
+    def read_records(self, offset: int = 0):
+        """Read complete journal records starting at a byte offset
+
+        Returns the records and the offset just past the last complete line,
+        so a record that is still being written is picked up on the next read.
+        """
+        if not os.path.exists(self.journal_file):
+            return [], 0
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        return self.parse_records(data[:end]), offset + end
+
+    @staticmethod
+    def parse_records(data: bytes) -> List[Dict[str, Any]]:
+        """Decode complete journal lines"""
+        records = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(serialization.loads(line))
+            except ValueError:
+                # A torn line from an interrupted write; skip it rather than fail the load
+                continue
+        return records
+
+    @staticmethod
+    def apply(incidents: Dict[str, Dict[str, Any]], record: Dict[str, Any]):
+        """Apply a single change record"""
+        if record.get('op') == 'put':
+            incident = record['incident']
+            incidents[incident['id']] = incident
+        elif record.get('op') == 'delete':
+            incidents.pop(record['id'], None)
+
+    def put(self, incident: Dict[str, Any]):
+        """Record a created or updated incident"""
+        self._append({'op': 'put', 'incident': incident})
+
+    def put_many(self, incidents: List[Dict[str, Any]]):
+        """Record several new or updated incidents in one append"""
+        self._append_all({'op': 'put', 'incident': incident} for incident in incidents)
+
+    def delete(self, incident_id: str):
+        """Record a deleted incident"""
+        self._append({'op': 'delete', 'id': incident_id})
+
+    def delete_many(self, incident_ids: List[str]):
+        """Record several deletions in one append"""
+        self._append_all({'op': 'delete', 'id': incident_id} for incident_id in incident_ids)
+
+    def replace_all(self, incidents: List[Dict[str, Any]]):
+        """Replace the whole incident set"""
+        self.compact(incidents)
+
+    def _append(self, record: Dict[str, Any]):
+        self._append_all([record])
+
+    def _append_all(self, records):
+        written = 0
+        with self._file_lock.exclusive():
+            if self._journal_records is None:
+                self._journal_records = len(self.read_records()[0])
+            with open(self.journal_file, 'ab') as f:
+                for record in records:
+                    f.write(serialization.dumps(record) + b'\n')
+                    written += 1
+        with self._lock:
+            self._journal_records += written
+        self.maybe_compact()
+
+    def needs_compaction(self) -> bool:
+        """Check whether the journal has grown past its size or record threshold"""
+        try:
+            size = os.path.getsize(self.journal_file)
+        except OSError:
+            return False
+        return size >= self.max_journal_bytes or (self._journal_records or 0) >= self.max_journal_records
+
+    def maybe_compact(self):
+        """Start a background compaction if the journal is over threshold"""
+        with self._lock:
+            if self._compacting or not self.needs_compaction():
+                return
+            self._compacting = True
+        threading.Thread(target=self._background_compact, name='journal-compactor', daemon=True).start()
+
+    def _background_compact(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Journal compaction error: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def compact(self, incidents: Optional[List[Dict[str, Any]]] = None):
+        """Write a fresh snapshot and truncate the journal
+
+        When `incidents` is given it becomes the new snapshot as-is, which is
+        how full rewrites (e.g. from the CLI) are stored.
+        """
+        with self._file_lock.exclusive():
+            folded = None
+            if incidents is None:
+                old_sig = _file_signature(self.snapshot_file)
+                try:
+                    with open(self.journal_file, 'rb') as f:
+                        folded = f.read()
+                except FileNotFoundError:
+                    folded = b''
+                incidents = self.load()
+            self._write_snapshot(incidents)
+            # Replaying records that made it into the snapshot is harmless, so a
+            # crash between the replace and the truncate loses nothing
+            with open(self.journal_file, 'w'):
+                pass
+            self._journal_records = 0
+            # Kept until the next compaction so this process's store can carry on without a reload
+            self._folded = None if folded is None else (old_sig, folded, _file_signature(self.snapshot_file))
+
+    def _write_snapshot(self, incidents: List[Dict[str, Any]]):
+        """Write to a temp file and rename it into place so readers never see a partial file"""
+        directory = os.path.dirname(os.path.abspath(self.snapshot_file))
+        fd, tmp_file = tempfile.mkstemp(prefix='.incidents-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(serialization.dumps(incidents))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+
+class SQLiteBackend:
+    """SQLite storage backend in WAL mode
+
+    Each incident is stored as its JSON document alongside indexed columns
+    for id, priority, resolved, created_at and the AI category, so filtered
+    SQL queries against the database use an index instead of a scan (the
+    app itself loads everything once and filters in memory). WAL mode lets
+    any number of worker processes read while one writes. A `changes` table
+    records every write so other processes can catch up incrementally.
+    """
+
+    MAX_CHANGES = 10000
+
+    def __init__(self, db_file: str = 'incidents.db', timeout: float = LOCK_TIMEOUT):
+        self.db_file = db_file
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._depth = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not be shared across a fork, so reconnect in a new process
+        if self._conn is None or self._pid != os.getpid():
+            self._depth = 0
+            conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS incidents (
+                    id TEXT PRIMARY KEY,
+                    priority TEXT,
+                    resolved INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT,
+                    category TEXT,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_incidents_priority ON incidents(priority);
+                CREATE INDEX IF NOT EXISTS idx_incidents_resolved ON incidents(resolved);
+                CREATE INDEX IF NOT EXISTS idx_incidents_created_at ON incidents(created_at);
+                CREATE INDEX IF NOT EXISTS idx_incidents_category ON incidents(category);
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT NOT NULL,
+                    incident_id TEXT,
+                    data TEXT
+                );
+            ''')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _row(incident: Dict[str, Any]):
+        analysis = incident.get('ai_analysis') or {}
+        return (incident['id'], incident.get('priority'), 1 if incident.get('resolved') else 0,
+                incident.get('created_at'), analysis.get('category'),
+                serialization.dumps(incident).decode('utf-8'))
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load all incidents in creation order"""
+        incidents, _ = self.load_state()
+        return list(incidents.values())
+
+    @contextmanager
+    def transaction(self, immediate: bool = True):
+        """Run the enclosed statements in one transaction; nested uses join the outer one
+
+        `immediate` takes SQLite's write lock up front so a read-modify-write
+        cycle cannot interleave with another process's write.
+        """
+        with self._lock:
+            conn = self._connect()
+            outermost = self._depth == 0
+            if outermost:
+                try:
+                    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+                except sqlite3.OperationalError as e:
+                    if 'locked' in str(e):
+                        raise StorageLockTimeout(f"Timed out waiting for {self.db_file}") from e
+                    raise
+            self._depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._depth -= 1
+                if outermost:
+                    conn.execute('ROLLBACK')
+                raise
+            self._depth -= 1
+            if outermost:
+                conn.execute('COMMIT')
+
+    def load_state(self):
+        """Load the id -> incident mapping and the change sequence it reflects"""
+        with self.transaction(immediate=False) as conn:
+            rows = conn.execute('SELECT data FROM incidents ORDER BY rowid').fetchall()
+            seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+        incidents = {}
+        for (data,) in rows:
+            incident = serialization.loads(data)
+            incidents[incident['id']] = incident
+        return incidents, seq
+
+    def signature(self):
+        """Changes whenever another connection commits; costs no disk I/O"""
+        with self._lock:
+            return self._connect().execute('PRAGMA data_version').fetchone()[0]
+
+    def changes_since(self, position):
+        """Change records after sequence `position`, or None if a full reload is needed"""
+        with self.transaction(immediate=False) as conn:
+            first = conn.execute('SELECT MIN(seq) FROM changes').fetchone()[0]
+            if first is not None and first > position + 1:
+                return None
+            rows = conn.execute('SELECT seq, op, incident_id, data FROM changes WHERE seq > ? ORDER BY seq',
+                                (position,)).fetchall()
+        records = []
+        for seq, op, incident_id, data in rows:
+            if op == 'reset':
+                return None
+            if op == 'put':
+                records.append({'op': 'put', 'incident': serialization.loads(data)})
+            else:
+                records.append({'op': 'delete', 'id': incident_id})
+            position = seq
+        return records, position
+
+    apply = staticmethod(IncidentJournal.apply)
+
+    def put(self, incident: Dict[str, Any]):
+        """Insert or update an incident, keeping its original position"""
+        self.put_many([incident])
+
+    def put_many(self, incidents: List[Dict[str, Any]]):
+        """Insert or update several incidents in one transaction"""
+        with self.transaction() as conn:
+            for incident in incidents:
+                row = self._row(incident)
+                conn.execute('''
+                    INSERT INTO incidents (id, priority, resolved, created_at, category, data)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET priority = excluded.priority, resolved = excluded.resolved,
+                        created_at = excluded.created_at, category = excluded.category, data = excluded.data
+                ''', row)
+                self._record_change(conn, 'put', incident['id'], row[-1])
+
+    def delete(self, incident_id: str):
+        """Delete an incident"""
+        self.delete_many([incident_id])
+
+    def delete_many(self, incident_ids: List[str]):
+        """Delete several incidents in one transaction"""
+        with self.transaction() as conn:
+            for incident_id in incident_ids:
+                conn.execute('DELETE FROM incidents WHERE id = ?', (incident_id,))
+                self._record_change(conn, 'delete', incident_id, None)
+
+    def replace_all(self, incidents: List[Dict[str, Any]]):
+        """Replace the whole incident set in one transaction"""
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM incidents')
+            conn.executemany(
+                'INSERT OR REPLACE INTO incidents (id, priority, resolved, created_at, category, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (self._row(i) for i in incidents))
+            self._record_change(conn, 'reset', None, None)
+
+    def _record_change(self, conn: sqlite3.Connection, op: str, incident_id: Optional[str], data: Optional[str]):
+        seq = conn.execute('INSERT INTO changes (op, incident_id, data) VALUES (?, ?, ?)',
+                           (op, incident_id, data)).lastrowid
+        if seq % 1000 == 0:
+            conn.execute('DELETE FROM changes WHERE seq <= ?', (seq - self.MAX_CHANGES,))
+
+
+def open_backend(kind: Optional[str] = None):
+    """Create the configured storage backend ('json' or 'sqlite')"""
+    kind = (kind or STORAGE_BACKEND).lower()
+    if kind == 'sqlite':
+        return SQLiteBackend(INCIDENT_DB)
+    if kind == 'json':
+        return IncidentJournal(INCIDENT_FILE)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def migrate_json_to_sqlite(json_file: str = INCIDENT_FILE, db_file: str = INCIDENT_DB) -> int:
+    """Import incidents.json (and its journal) into a SQLite database"""
+    incidents = IncidentJournal(json_file).load()
+    SQLiteBackend(db_file).replace_all(incidents)
+    return len(incidents)
+
+
+PRIORITY_RANK = {'Critical': 4, 'High': 3, 'Medium': 2, 'Low': 1}
+
+# Sort orders for IncidentStore.query; 'priority' matches the dashboard's ordering
+SORT_ORDERS = ('priority', 'newest', 'oldest')
+
+
+def timestamp_key(value: Optional[str]) -> int:
+    """Turn a '%Y-%m-%d %H:%M:%S' timestamp into a sortable integer"""
+    digits = ''.join(c for c in (value or '') if c.isdigit())
+    return int(digits.ljust(14, '0')[:14]) if digits else 0
+
+
+def incident_category(incident: Dict[str, Any]) -> Optional[str]:
+    """The AI category of an incident, if it has been analysed"""
+    analysis = incident.get('ai_analysis')
+    return analysis.get('category') if analysis else None
+
+
+def page_incidents(matches: List[Dict[str, Any]], created_from: Optional[int] = None,
+                   created_to: Optional[int] = None, sort: str = 'priority', after=None,
+                   limit: Optional[int] = None):
+    """Apply the date range, sort order and paging of IncidentStore.query to a candidate list"""
+    if created_from is not None or created_to is not None:
+        low = created_from if created_from is not None else 0
+        high = created_to if created_to is not None else float('inf')
+        matches = [i for i in matches if low <= timestamp_key(i.get('created_at')) <= high]
+    total = len(matches)
+
+    keyed = ((IncidentStore.sort_key(i, sort), i) for i in matches)
+    if after is not None:
+        after = tuple(after)
+        keyed = (pair for pair in keyed if pair[0] > after)
+    if limit is None:
+        page = sorted(keyed, key=lambda pair: pair[0])
+        return [i for _, i in page], total, None
+    # Only the page is fully sorted; the rest are merely compared against it
+    page = heapq.nsmallest(limit + 1, keyed, key=lambda pair: pair[0])
+    has_more = len(page) > limit
+    page = page[:limit]
+    last_key = page[-1][0] if has_more and page else None
+    return [i for _, i in page], total, last_key
+
+
+class IncidentStore:
+    """Process-resident incident set with an id index
+
+    Incidents are loaded once and served from memory. Before each operation
+    the backend's change signature is compared with the last one seen, so
+    edits made by another process (e.g. the project.py CLI or another
+    worker) are still picked up: new change records are applied
+    incrementally, also across the journal's own background compactions,
+    and only a snapshot rewritten elsewhere triggers a full reload. Secondary indexes
+    on status, priority and category keep filtered queries off a full scan.
+
+    Listeners (objects with reset(incidents), add(incident) and
+    remove(incident)) see every change to the in-memory set, including ones
+    picked up from other processes. reset() receives the whole set after a
+    full (re)load. An update is a remove of the old record followed by an
+    add of the new one, unless the listener defines update(old, new).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.RLock()
+        self._incidents: Dict[str, Dict[str, Any]] = {}
+        self._by_status: Dict[bool, set] = {}
+        self._by_priority: Dict[str, set] = {}
+        self._by_category: Dict[Optional[str], set] = {}
+        self._position = None
+        self._signature = None
+        self._listeners = []
+        self._version = 0
+
+    def add_listener(self, listener):
+        """Keep a derived structure in step with the incident set"""
+        with self._lock:
+            self.refresh()
+            self._listeners.append(listener)
+            listener.reset(list(self._incidents.values()))
+
+    def refresh(self):
+        """Pick up changes written by other processes since the last look"""
+        with self._lock:
+            signature = self.backend.signature()
+            if self._signature is not None and signature == self._signature:
+                return
+            changes = self.backend.changes_since(self._position) if self._signature is not None else None
+            if changes is None:
+                incidents, self._position = self.backend.load_state()
+                self._reset(incidents)
+            else:
+                records, self._position = changes
+                for record in records:
+                    if record.get('op') == 'put':
+                        self._put_local(record['incident'])
+                    elif record.get('op') == 'delete':
+                        self._remove_local(record['id'])
+            self._signature = signature
+
+    def _reset(self, incidents: Dict[str, Dict[str, Any]]):
+        self._version += 1
+        self._incidents = {}
+        self._by_status, self._by_priority, self._by_category = {}, {}, {}
+        for incident in incidents.values():
+            self._put_local(incident, notify=False)
+        for listener in self._listeners:
+            listener.reset(list(self._incidents.values()))
+
+    def _index_keys(self, incident: Dict[str, Any]):
+        return (
+            (self._by_status, bool(incident.get('resolved', False))),
+            (self._by_priority, incident.get('priority')),
+            (self._by_category, incident_category(incident)),
+        )
+
+    def _put_local(self, incident: Dict[str, Any], notify: bool = True):
+        """Apply a stored incident to the in-memory set and indexes"""
+        previous = self._incidents.get(incident['id'])
+        if previous == incident:
+            # Typically our own write coming back from the backend's change feed
+            return
+        self._version += 1
+        if previous is not None:
+            self._unindex(previous)
+        # Assigning to an existing key keeps the incident's creation-order position
+        self._incidents[incident['id']] = incident
+        for index, key in self._index_keys(incident):
+            index.setdefault(key, set()).add(incident['id'])
+        if not notify:
+            return
+        for listener in self._listeners:
+            if previous is None:
+                listener.add(incident)
+            elif hasattr(listener, 'update'):
+                listener.update(previous, incident)
+            else:
+                listener.remove(previous)
+                listener.add(incident)
+
+    def _remove_local(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        """Drop an incident from the in-memory set and indexes"""
+        incident = self._incidents.pop(incident_id, None)
+        if incident is not None:
+            self._version += 1
+            self._unindex(incident)
+            for listener in self._listeners:
+                listener.remove(incident)
+        return incident
+
+    def _unindex(self, incident: Dict[str, Any]):
+        for index, key in self._index_keys(incident):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(incident['id'])
+                if not ids:
+                    del index[key]
+
+    def all(self) -> List[Dict[str, Any]]:
+        """All incidents in creation order"""
+        with self._lock:
+            self.refresh()
+            return list(self._incidents.values())
+
+    def get(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        """Look up an incident by id"""
+        with self._lock:
+            self.refresh()
+            return self._incidents.get(incident_id)
+
+    def __len__(self):
+        with self._lock:
+            self.refresh()
+            return len(self._incidents)
+
+    @property
+    def version(self) -> int:
+        """Counter that changes whenever the incident set does (per process)"""
+        with self._lock:
+            self.refresh()
+            return self._version
+
+    @staticmethod
+    def sort_key(incident: Dict[str, Any], sort: str = 'priority'):
+        """Total ordering key for a sort order; the id breaks ties"""
+        created = timestamp_key(incident.get('created_at'))
+        if sort == 'newest':
+            return (-created, incident['id'])
+        if sort == 'oldest':
+            return (created, incident['id'])
+        return (-PRIORITY_RANK.get(incident.get('priority'), 0), -created, incident['id'])
+
+    def query(self, resolved: Optional[bool] = None, priorities: Optional[List[str]] = None,
+              categories: Optional[List[str]] = None, created_from: Optional[int] = None,
+              created_to: Optional[int] = None, sort: str = 'priority', after=None,
+              limit: Optional[int] = None):
+        """Filter, sort and page incidents
+
+        Candidates come from the secondary indexes; only they are checked
+        against the date range. `after` is the sort key of the last item of
+        the previous page. Returns the page, the total number of matches and
+        the sort key of the page's last item (None when there are no more).
+        """
+        with self._lock:
+            self.refresh()
+            candidate_sets = []
+            if resolved is not None:
+                candidate_sets.append(self._by_status.get(resolved, set()))
+            if priorities is not None:
+                candidate_sets.append(set().union(*(self._by_priority.get(p, set()) for p in priorities)))
+            if categories is not None:
+                candidate_sets.append(set().union(*(self._by_category.get(c, set()) for c in categories)))
+            if candidate_sets:
+                candidate_sets.sort(key=len)
+                ids = candidate_sets[0].intersection(*candidate_sets[1:])
+                matches = [self._incidents[i] for i in ids]
+            else:
+                matches = list(self._incidents.values())
+
+        return page_incidents(matches, created_from, created_to, sort, after, limit)
+
+    @contextmanager
+    def transaction(self):
+        """Hold the store and backend locks across several operations"""
+        with self._lock, self.backend.transaction():
+            yield self
+
+    def add(self, incident: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a new incident"""
+        with self._lock, self.backend.transaction():
+            self.refresh()
+            self.backend.put(incident)
+            self._put_local(incident)
+            return incident
+
+    def add_many(self, incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store several new incidents with a single backend write"""
+        with self._lock, self.backend.transaction():
+            self.refresh()
+            self.backend.put_many(incidents)
+            for incident in incidents:
+                self._put_local(incident)
+            return incidents
+
+    def update(self, incident_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply field changes to an incident, returning the updated record
+
+        The backend transaction is held across the re-read and the write, so
+        a concurrent writer in another process cannot slip in between.
+        """
+        with self._lock, self.backend.transaction():
+            self.refresh()
+            current = self._incidents.get(incident_id)
+            if current is None:
+                return None
+            updated = dict(current, **changes)
+            self.backend.put(updated)
+            self._put_local(updated)
+            return updated
+
+    def delete(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        """Remove an incident, returning it"""
+        with self._lock, self.backend.transaction():
+            self.refresh()
+            if incident_id not in self._incidents:
+                return None
+            self.backend.delete(incident_id)
+            return self._remove_local(incident_id)
+
+    def delete_many(self, incident_ids: List[str]) -> List[Dict[str, Any]]:
+        """Remove several incidents with a single backend write, returning those that existed"""
+        with self._lock, self.backend.transaction():
+            self.refresh()
+            incident_ids = [i for i in incident_ids if i in self._incidents]
+            if incident_ids:
+                self.backend.delete_many(incident_ids)
+            return [self._remove_local(i) for i in incident_ids]
+
+    def replace_all(self, incidents: List[Dict[str, Any]]):
+        """Replace the whole incident set"""
+        with self._lock:
+            self.backend.replace_all(incidents)
+            self._signature = None
+            self.refresh()
+
+
+def main():
+    """Storage maintenance commands"""
+    parser = argparse.ArgumentParser(description='Incident storage maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='Import incidents.json into the SQLite backend')
+    migrate.add_argument('--source', default=INCIDENT_FILE, help='JSON snapshot to import')
+    migrate.add_argument('--db', default=INCIDENT_DB, help='SQLite database to write')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        count = migrate_json_to_sqlite(args.source, args.db)
+        print(f"Migrated {count} incidents from {args.source} to {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,10 +9,39 @@ import time
 import subprocess
 import sys
 import threading
+import os
+import pytest
 from datetime import datetime
+from audit import AuditLogger
+from storage import IncidentJournal, IncidentStore, SQLiteBackend, migrate_json_to_sqlite
 
-def test_flask_app():
-    """Test Flask app endpoints"""
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The Flask app module, imported from an empty directory
+
+    Importing app opens the default store, so it must not load or lock an
+    incidents.json next to the code. The session stays in that directory,
+    so the relative paths the module keeps using resolve there too.
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import app
+        yield app
+    finally:
+        os.chdir(cwd)
+
+@pytest.fixture
+def store(app_module, tmp_path, monkeypatch):
+    """An empty store in tmp_path serving the app, with the action log and working directory there too"""
+    monkeypatch.chdir(tmp_path)
+    store = IncidentStore(IncidentJournal(str(tmp_path / "incidents.json")))
+    monkeypatch.setattr(app_module, "store", store)
+    monkeypatch.setattr(app_module, "audit_log", AuditLogger(str(tmp_path / "incident_log.txt")))
+    return store
+
+def check_flask_app():
+    """Exercise the endpoints of a running dev server (run this file directly; pytest does not collect it)"""
     base_url = "http://127.0.0.1:4506"
     
     print("Testing Flask application endpoints...")
@@ -71,6 +100,838 @@ def test_flask_app():
     except requests.exceptions.RequestException as e:
         print(f"❌ POST requests: Error - {e}")
 
+def test_journal_replay_and_compaction(tmp_path):
+    """Journal records replay over the snapshot and compact back into it"""
+    snapshot = str(tmp_path / "incidents.json")
+    journal = IncidentJournal(snapshot)
+    
+    first = {"id": "a", "description": "Server down", "resolved": False}
+    second = {"id": "b", "description": "Login problem", "resolved": False}
+    journal.put(first)
+    journal.put(second)
+    journal.put(dict(first, resolved=True))
+    journal.delete("b")
+    
+    reopened = IncidentJournal(snapshot)
+    assert reopened.load() == [dict(first, resolved=True)]
+    
+    reopened.compact()
+    with open(snapshot) as f:
+        assert json.load(f) == [dict(first, resolved=True)]
+    assert os.path.getsize(reopened.journal_file) == 0
+
+def test_store_picks_up_out_of_band_changes(tmp_path):
+    """A store sees journal records and snapshots written by another process"""
+    snapshot = str(tmp_path / "incidents.json")
+    store = IncidentStore(IncidentJournal(snapshot))
+    store.add({"id": "a", "description": "Server down", "resolved": False})
+    
+    # Another process (e.g. the CLI) appends to the journal, then rewrites the snapshot
+    other = IncidentJournal(snapshot)
+    other.put({"id": "b", "description": "Login problem", "resolved": False})
+    assert store.get("b")["description"] == "Login problem"
+    
+    other.compact([{"id": "c", "description": "Malware", "resolved": False}])
+    assert [i["id"] for i in store.all()] == ["c"]
+    assert store.get("a") is None
+
+def test_own_compactions_do_not_reload_the_store(tmp_path):
+    """The store follows its journal through background compactions without resetting listeners"""
+    class Listener:
+        resets = 0
+        def reset(self, incidents):
+            self.resets += 1
+        def add(self, incident):
+            pass
+        def remove(self, incident):
+            pass
+    
+    snapshot = str(tmp_path / "incidents.json")
+    journal = IncidentJournal(snapshot, max_journal_records=100)
+    store = IncidentStore(journal)
+    listener = Listener()
+    store.add_listener(listener)
+    for n in range(1000):
+        store.add({"id": str(n), "description": "Server down", "resolved": False})
+        if n % 150 == 0:
+            # Another process appends while compactions come and go
+            IncidentJournal(snapshot).put({"id": f"cli-{n}", "description": "Login problem", "resolved": False})
+    while journal._compacting:
+        time.sleep(0.01)
+    assert len(store.all()) == 1007 and listener.resets == 1
+    
+    IncidentJournal(snapshot).compact([{"id": "c", "description": "Malware", "resolved": False}])
+    assert [i["id"] for i in store.all()] == ["c"] and listener.resets == 2
+
+def test_sqlite_backend_migration_and_cross_process_changes(tmp_path):
+    """The SQLite backend imports a JSON snapshot and shares changes between connections"""
+    snapshot = str(tmp_path / "incidents.json")
+    db = str(tmp_path / "incidents.db")
+    IncidentJournal(snapshot).compact([
+        {"id": "a", "description": "Server down", "priority": "High", "resolved": False,
+         "created_at": "2025-01-01 10:00:00", "ai_analysis": {"category": "Infrastructure"}},
+        {"id": "b", "description": "Typo", "priority": "Low", "resolved": True,
+         "created_at": "2025-01-02 10:00:00", "ai_analysis": None},
+    ])
+    assert migrate_json_to_sqlite(snapshot, db) == 2
+    
+    store = IncidentStore(SQLiteBackend(db))
+    assert [i["id"] for i in store.all()] == ["a", "b"]
+    
+    # A second connection stands in for another worker process
+    other = SQLiteBackend(db)
+    other.put({"id": "c", "description": "Malware", "priority": "Critical", "resolved": False,
+               "created_at": "2025-01-03 10:00:00", "ai_analysis": None})
+    other.put(dict(store.get("a"), resolved=True))
+    other.delete("b")
+    assert [i["id"] for i in store.all()] == ["a", "c"]
+    assert store.get("a")["resolved"] is True
+
+@pytest.mark.usefixtures("store")
+def test_concurrent_writers_lose_no_incidents(app_module, tmp_path, monkeypatch):
+    """Hammer the endpoints from many threads while a second process-like store writes too"""
+    snapshot = str(tmp_path / "incidents.json")
+    # A low threshold keeps background compactions running during the test
+    monkeypatch.setattr(app_module, "store", IncidentStore(IncidentJournal(snapshot, max_journal_records=25)))
+    # A separate journal has its own lock file handle, just like the CLI in another process
+    cli_store = IncidentStore(IncidentJournal(snapshot, max_journal_records=25))
+    
+    created = []
+    errors = []
+    
+    def web_worker(worker):
+        client = app_module.app.test_client()
+        for n in range(20):
+            response = client.post("/incidents", json={"description": f"web {worker}-{n}", "priority": "High"})
+            if response.status_code != 201:
+                errors.append(response.status_code)
+                continue
+            incident_id = response.get_json()["id"]
+            created.append(incident_id)
+            if client.patch(f"/incidents/{incident_id}/resolve").status_code != 200:
+                errors.append("resolve")
+    
+    def cli_worker(worker):
+        for n in range(20):
+            incident = {"id": f"cli-{worker}-{n}", "description": f"cli {worker}-{n}", "priority": "Low",
+                        "resolved": False, "created_at": "2025-01-01 00:00:00", "resolved_at": None,
+                        "ai_analysis": None}
+            cli_store.add(incident)
+            created.append(incident["id"])
+            cli_store.update(incident["id"], {"description": f"cli {worker}-{n} updated"})
+    
+    threads = [threading.Thread(target=web_worker, args=(w,)) for w in range(8)]
+    threads += [threading.Thread(target=cli_worker, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    stored = {i["id"]: i for i in IncidentJournal(snapshot).load()}
+    assert len(created) == 8 * 20 + 4 * 20
+    assert set(stored) == set(created)
+    assert all(i["resolved"] for i in stored.values() if i["priority"] == "High")
+    assert all(i["description"].endswith("updated") for i in stored.values() if i["priority"] == "Low")
+
+def test_incremental_aggregates_match_a_full_recount(tmp_path):
+    """Counters kept up to date by store changes equal a recount after every kind of change"""
+    from aggregates import IncidentAggregates
+    
+    path = str(tmp_path / "incidents.json")
+    store = IncidentStore(IncidentJournal(path))
+    aggregates = IncidentAggregates()
+    store.add_listener(aggregates)
+    
+    def assert_recounted():
+        assert aggregates.export() == IncidentAggregates.from_incidents(store.all()).export()
+    
+    for n in range(12):
+        store.add({"id": f"i{n}", "description": f"incident {n}", "priority": ["Low", "High", "Critical"][n % 3],
+                   "resolved": False, "created_at": f"2025-03-{n + 1:02d} 09:00:00", "resolved_at": None,
+                   "ai_analysis": {"category": "Network"} if n % 2 else None})
+    assert_recounted()
+    store.update("i0", {"priority": "Medium"})
+    store.update("i1", {"ai_analysis": {"category": "Security"}})
+    store.update("i2", {"ai_analysis": None, "created_at": "2024-12-31 23:00:00"})
+    store.update("i3", {"resolved": True, "resolved_at": "2025-03-20 10:00:00"})
+    assert_recounted()
+    store.update("i3", {"resolved": False, "priority": "Critical"})
+    store.delete("i4")
+    store.delete_many(["i5", "i6"])
+    assert_recounted()
+    
+    # Changes made by another process arrive through refresh()
+    other = IncidentStore(IncidentJournal(path))
+    other.update("i7", {"resolved": True, "priority": "Low"})
+    other.delete("i8")
+    other.add({"id": "x1", "description": "from elsewhere", "priority": "High", "resolved": False,
+               "created_at": "2025-04-01 08:00:00", "resolved_at": None, "ai_analysis": {"category": "Database"}})
+    store.refresh()
+    assert_recounted()
+    
+    store.replace_all(store.all()[:3])
+    assert_recounted()
+    assert aggregates.total == 3
+
+def test_incident_pages_follow_dashboard_order(app_module, store):
+    """Cursor pages cover every matching incident once, in priority then newest-first order"""
+    priorities = ["Low", "Critical", "Medium", "High"]
+    for n in range(23):
+        store.add({"id": f"i{n:02d}", "description": f"incident {n}", "priority": priorities[n % 4],
+                   "resolved": n % 5 == 0, "created_at": f"2025-01-{n + 1:02d} 12:00:00",
+                   "resolved_at": None, "ai_analysis": None})
+    
+    client = app_module.app.test_client()
+    seen, cursor = [], None
+    while True:
+        url = "/incidents?status=open&limit=4" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).get_json()
+        seen += page["incidents"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    
+    rank = {"Critical": 4, "High": 3, "Medium": 2, "Low": 1}
+    expected = sorted((i for i in store.all() if not i["resolved"]),
+                      key=lambda i: (rank[i["priority"]], i["created_at"]), reverse=True)
+    assert [i["id"] for i in seen] == [i["id"] for i in expected]
+    assert page["total"] == len(expected)
+    assert client.get("/incidents?sort=sideways").status_code == 400
+
+def test_tampered_cursors_are_rejected(app_module, store):
+    """Cursors whose key does not fit the sort order get a 400, not a server error"""
+    import base64
+    
+    store.add({"id": "i1", "description": "incident", "priority": "High", "resolved": False,
+               "created_at": "2025-01-01 12:00:00", "resolved_at": None, "ai_analysis": None})
+    client = app_module.app.test_client()
+    
+    def cursor(payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+    
+    for sort, payload in [("priority", ["priority", 5]), ("priority", ["priority", ["a", "b", "c"]]),
+                          ("priority", ["priority", [-3, -1]]), ("newest", ["newest", [True, "i1"]]),
+                          ("oldest", ["oldest", None]), ("priority", "priority"), ("priority", ["priority"])]:
+        response = client.get(f"/incidents?sort={sort}&cursor={cursor(payload)}")
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid cursor"}
+    assert client.get(f"/incidents?cursor={cursor(['priority', [-3, -1, 'i0']])}").get_json()["total"] == 1
+
+def test_background_analysis_patches_supersedes_and_pushes_back(app_module, store, monkeypatch):
+    """Queued analyses patch the stored incident, yield to newer descriptions, and a full queue answers 503"""
+    from jobs import AnalysisQueue
+    
+    class GatedProcessor:
+        """Analyses block until released, so the test decides when workers finish"""
+        def __init__(self):
+            self.gate = threading.Event()
+        
+        def analyze_incident(self, description):
+            self.gate.wait(5)
+            critical = "breach" in description
+            return {"suggested_priority": "Critical" if critical else "Low",
+                    "category": "Security" if critical else "General", "response_steps": ["Investigate"]}
+    
+    processor = GatedProcessor()
+    analysis_queue = AnalysisQueue(store, processor, workers=1, max_pending=1, submit_timeout=0.05)
+    monkeypatch.setattr(app_module, "analysis_queue", analysis_queue)
+    client = app_module.app.test_client()
+    
+    def wait_for(job_id):
+        deadline = time.monotonic() + 5
+        while analysis_queue.job(job_id)["status"] in ("queued", "running") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return analysis_queue.job(job_id)
+    
+    try:
+        created = client.post("/incidents", json={"description": "Customer data breach", "use_ai": True,
+                                                  "dedupe": False})
+        assert created.status_code == 201
+        incident = created.get_json()
+        assert incident["analysis_status"] == "pending" and incident["ai_analysis"] is None
+        assert incident["priority"] == "Medium"
+        while analysis_queue.job(incident["analysis_job"])["status"] == "queued":
+            time.sleep(0.01)
+        
+        # The worker holds the first job; a re-description queues a second one and a third create finds no room
+        updated = client.put(f"/incidents/{incident['id']}", json={"description": "Printer out of paper",
+                                                                    "reanalyze": True}).get_json()
+        full = client.post("/incidents", json={"description": "Disk full", "use_ai": True, "dedupe": False})
+        assert full.status_code == 503 and full.headers["Retry-After"] == "5"
+        assert len(store) == 1
+        
+        processor.gate.set()
+        assert wait_for(incident["analysis_job"])["status"] == "superseded"
+        assert wait_for(updated["analysis_job"])["status"] == "done"
+        status = client.get(f"/incidents/{incident['id']}/analysis").get_json()
+        assert status["analysis_status"] == "complete" and status["ai_analysis"]["category"] == "General"
+        assert store.get(incident["id"])["priority"] == "Medium"  # Re-analysis leaves the priority alone
+        
+        # A create without an explicit priority takes the suggested one; an explicit priority is kept
+        upgraded = client.post("/incidents", json={"description": "Another breach", "use_ai": True,
+                                                   "dedupe": False}).get_json()
+        assert wait_for(upgraded["analysis_job"])["status"] == "done"
+        kept = client.post("/incidents", json={"description": "breach drill", "priority": "Low", "use_ai": True,
+                                               "dedupe": False}).get_json()
+        assert wait_for(kept["analysis_job"])["status"] == "done"
+        assert store.get(upgraded["id"])["priority"] == "Critical"
+        assert store.get(kept["id"])["priority"] == "Low"
+        stats = client.get("/incidents/analysis/queue").get_json()
+        assert (stats["completed"], stats["superseded"], stats["rejected"]) == (3, 1, 0)
+    finally:
+        processor.gate.set()
+
+def test_analyses_orphaned_by_an_exited_worker_are_requeued(app_module, store, monkeypatch):
+    """Pending analyses whose worker is gone are re-queued on the next request; live workers keep theirs"""
+    from jobs import AnalysisQueue
+    
+    class Processor:
+        def analyze_incident(self, description):
+            return {"suggested_priority": "Critical", "category": "Security", "response_steps": ["Investigate"]}
+    
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    pending = {"description": "Customer data breach", "priority": "Medium", "resolved": False,
+               "ai_analysis": None, "analysis_status": "pending"}
+    store.add_many([
+        dict(pending, id="orphan", analysis_request={"worker": exited.pid, "apply_priority": True}),
+        dict(pending, id="legacy"),  # Queued before owners were recorded
+        dict(pending, id="live", analysis_request={"worker": os.getppid(), "apply_priority": True}),
+    ])
+    analysis_queue = AnalysisQueue(store, Processor(), workers=0, recover_interval=3600)
+    monkeypatch.setattr(app_module, "analysis_queue", analysis_queue)
+    client = app_module.app.test_client()
+    
+    assert client.get("/incidents/orphan/analysis").get_json()["analysis_status"] == "complete"
+    assert store.get("orphan")["priority"] == "Critical"
+    assert store.get("legacy")["analysis_status"] == "complete" and store.get("legacy")["priority"] == "Medium"
+    assert store.get("live")["analysis_status"] == "pending"
+    assert analysis_queue.stats()["recovered"] == 2
+    
+    # The store is scanned again only after recover_interval
+    store.update("live", {"analysis_request": {"worker": exited.pid, "apply_priority": False}})
+    client.get("/incidents/live/analysis")
+    assert store.get("live")["analysis_status"] == "pending"
+
+@pytest.mark.usefixtures("store")
+def test_bulk_import_writes_once_and_reports_each_line(app_module, tmp_path, monkeypatch):
+    """NDJSON uploads store valid lines in one backend write and report every rejected line"""
+    backend = SQLiteBackend(str(tmp_path / "incidents.db"))
+    monkeypatch.setattr(app_module, "store", IncidentStore(backend))
+    writes = []
+    put_many = backend.put_many
+    monkeypatch.setattr(backend, "put_many", lambda incidents: writes.append(len(incidents)) or put_many(incidents))
+    
+    lines = [json.dumps({"description": f"Disk full on node {n}"}) for n in range(300)]
+    lines[5] = "{not json"
+    lines[9] = json.dumps({"description": "  "})
+    lines.append(json.dumps({"description": "Ransomware on file server", "use_ai": True}))
+    client = app_module.app.test_client()
+    response = client.post("/incidents/bulk", data="\n".join(lines), content_type="application/x-ndjson")
+    
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body["created"] == 299 and body["failed"] == 2
+    assert [r["error"] for r in body["results"] if "error" in r] == ["Invalid JSON", "Description cannot be blank"]
+    assert writes == [299]
+    stored = IncidentStore(SQLiteBackend(str(tmp_path / "incidents.db"))).all()
+    assert len(stored) == 299 and stored[-1]["priority"] == "Critical"
+    assert stored[-1]["ai_analysis"]["category"] == "Security"
+    
+    # Only the first MAX_BULK_ERRORS rejected lines are listed; the rest are counted
+    junk = client.post("/incidents/bulk", data="\n".join(["{junk"] * 250), content_type="application/x-ndjson")
+    assert junk.status_code == 400
+    body = junk.get_json()
+    assert body["failed"] == 250 and body["unreported_errors"] == 150 and len(body["results"]) == 100
+
+def test_export_streams_filtered_incidents(app_module, store):
+    """The export streams every matching incident as NDJSON or a gzipped JSON array"""
+    import gzip
+    
+    store.add_many([{"id": f"i{n:04d}", "description": "d" * 100, "priority": "High" if n % 3 else "Low",
+                     "resolved": False, "created_at": f"2025-01-01 00:00:{n % 60:02d}", "resolved_at": None,
+                     "ai_analysis": None} for n in range(1500)])
+    client = app_module.app.test_client()
+    
+    response = client.get("/incidents/export?priority=Low")
+    assert response.mimetype == "application/x-ndjson" and not response.is_sequence
+    exported = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(exported) == 500 and {i["priority"] for i in exported} == {"Low"}
+    assert [i["id"] for i in exported] == sorted((i["id"] for i in exported), key=lambda i: (int(i[1:]) % 60, i))
+    
+    response = client.get("/incidents/export?format=json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == store.query(sort="oldest")[0]
+
+def test_event_stream_resumes_from_last_event_id(tmp_path):
+    """Store changes become SSE events; reconnects resume or are told to refetch"""
+    from events import EventBroker
+    
+    store = IncidentStore(IncidentJournal(str(tmp_path / "incidents.json")))
+    broker = EventBroker(insights=lambda: {"total": len(store)}, buffer_size=4)
+    store.add_listener(broker)
+    
+    def read(stream, count):
+        return [next(stream).decode() for _ in range(count)]
+    
+    live = broker.stream(heartbeat=0.05)
+    read(live, 2)  # retry hint and current insights
+    store.add({"id": "a", "description": "db down", "priority": "High", "resolved": False,
+               "created_at": "2025-01-01 00:00:00", "resolved_at": None, "ai_analysis": None})
+    store.update("a", {"resolved": True})
+    store.refresh()  # our own journal records coming back must not repeat as events
+    created, resolved, insights = read(live, 3)
+    assert "event: created" in created and "event: resolved" in resolved
+    assert 'data: {"total":1}' in insights
+    assert read(live, 1) == [": keepalive\n\n"]
+    
+    last_id = created.split("\n")[0][len("id: "):]
+    resumed = broker.stream(last_id, heartbeat=0.05)
+    assert [e.split("\n")[1] for e in read(resumed, 3)[1:]] == ["event: resolved", "event: insights"]
+    store.delete("a")
+    for n in range(4):
+        broker.publish("updated", {"n": n})
+    stale = broker.stream(last_id, heartbeat=0.05)
+    assert "event: reset" in read(stale, 2)[1]
+    assert "event: reset" in read(broker.stream("other-1", heartbeat=0.05), 2)[1]
+
+def test_read_endpoints_answer_conditional_gets(app_module, store, tmp_path, monkeypatch):
+    """Current ETags get a 304, repeated reads reuse the serialized body and changes bust both"""
+    from http_cache import ResponseCache
+    
+    monkeypatch.setattr(app_module, "response_cache", ResponseCache())
+    queries = []
+    query = store.query
+    monkeypatch.setattr(store, "query", lambda *args, **kwargs: queries.append(args) or query(*args, **kwargs))
+    client = app_module.app.test_client()
+    
+    first = client.get("/incidents?status=open")
+    etag = first.headers["ETag"]
+    assert client.get("/incidents?status=open", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/incidents?status=open").data == first.data
+    assert len(queries) == 1 and app_module.response_cache.hits == 1
+    
+    # A write from another process is picked up through the store's refresh
+    IncidentStore(IncidentJournal(str(tmp_path / "incidents.json"))).add(
+        {"id": "x", "description": "cli incident", "priority": "High", "resolved": False,
+         "created_at": "2025-01-01 00:00:00", "resolved_at": None, "ai_analysis": None})
+    changed = client.get("/incidents?status=open", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.get_json()["total"] == 1 and len(queries) == 2
+    
+    # Cached and 304 summaries are still written to the action log
+    actions = []
+    monkeypatch.setattr(app_module, "log_action", actions.append)
+    summary = client.get("/reports/summary")
+    assert client.get("/reports/summary", headers={"If-None-Match": summary.headers["ETag"]}).status_code == 304
+    assert client.get("/reports/summary").data == summary.data
+    assert actions == ["AI summary report generated"] * 3
+
+def test_archive_moves_resolved_incidents_out_of_the_store(app_module, store, tmp_path, monkeypatch):
+    """Archived incidents leave the store but stay listable and keep counting in the summary"""
+    from aggregates import IncidentAggregates
+    from archive import IncidentArchive
+    from http_cache import ResponseCache
+    
+    aggregates = IncidentAggregates()
+    store.add_listener(aggregates)
+    archive = IncidentArchive(str(tmp_path / "archive"))
+    for name, value in [("aggregates", aggregates), ("archive", archive), ("response_cache", ResponseCache())]:
+        monkeypatch.setattr(app_module, name, value)
+    for n in range(12):
+        resolved = n % 3 != 0
+        store.add({"id": f"i{n:02d}", "description": f"incident {n}", "priority": ["Low", "High"][n % 2],
+                   "resolved": resolved, "created_at": f"2025-0{n % 4 + 1}-10 08:00:00",
+                   "resolved_at": f"2025-0{n % 4 + 1}-20 08:00:00" if resolved else None, "ai_analysis": None})
+    client = app_module.app.test_client()
+    before = client.get("/reports/summary").get_json()
+    everything = client.get("/incidents?sort=newest&limit=100").get_json()["incidents"]
+    
+    assert archive.archive(store, older_than_days=90, now=datetime(2025, 6, 1)) == 4
+    assert sorted(os.listdir(archive.directory)) == [
+        "archive.lock", "incidents-2025-01.ndjson.gz", "incidents-2025-02.ndjson.gz", "manifest.json"]
+    assert len(store.all()) == 8 and archive.archive(store, older_than_days=90, now=datetime(2025, 6, 1)) == 0
+    
+    assert client.get("/reports/summary").get_json() == before
+    assert client.get("/incidents?status=resolved").get_json()["total"] == 4
+    seen, cursor = [], None
+    while True:
+        page = client.get("/incidents?include_archived=true&sort=newest&limit=5"
+                          + (f"&cursor={cursor}" if cursor else "")).get_json()
+        seen += page["incidents"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == everything and page["total"] == 12
+    high = client.get("/incidents?include_archived=true&status=resolved&priority=High").get_json()
+    assert high["total"] == 4 and {i["priority"] for i in high["incidents"]} == {"High"}
+
+def test_search_ranks_matches_and_follows_changes(app_module, store, monkeypatch):
+    """Search matches whole words, the last word as a prefix and hostname parts, ranks by frequency and tracks edits"""
+    from search import SearchIndex
+    
+    store.add({"id": "old", "description": "Payment gateway timeout on web-01.example.com", "priority": "High",
+               "resolved": False, "created_at": "2024-01-01 00:00:00", "resolved_at": None,
+               "ai_analysis": {"category": "Availability", "response_steps": ["1. Restart payment service"]}})
+    index = SearchIndex()
+    store.add_listener(index)
+    monkeypatch.setattr(app_module, "search_index", index)
+    store.add({"id": "new", "description": "Payment failures reported", "priority": "Low", "resolved": False,
+               "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "resolved_at": None, "ai_analysis": None})
+    client = app_module.app.test_client()
+    
+    def ids(query):
+        return [i["id"] for i in client.get("/incidents/search", query_string={"q": query}).get_json()["incidents"]]
+    
+    assert ids("payment") == ["old", "new"]
+    assert ids("failures PAYM") == ["new"] and ids("paym fail") == ids("paym ") == []
+    assert ids("web-01") == ids("example") == ids("web-01.example.com") == ["old"]
+    # Totals stay exact however many terms a prefix expands to
+    for n in range(150):
+        store.add({"id": f"host-{n}", "description": f"Webhook retries from web-{n:03d}", "priority": "Low",
+                   "resolved": False, "created_at": "2024-02-01 00:00:00", "resolved_at": None, "ai_analysis": None})
+    found = client.get("/incidents/search", query_string={"q": "web", "limit": 5}).get_json()
+    assert found["total"] == 151 and len(found["incidents"]) == 5
+    assert client.get("/incidents/search", query_string={"q": "webhook web-007"}).get_json()["total"] == 1
+    store.delete_many([f"host-{n}" for n in range(150)])
+    assert ids("restart") == ["old"] and ids("ransomware") == []
+    
+    store.update("new", {"description": "Ransomware note found"})
+    assert ids("ransom") == ["new"] and ids("payment") == ["old"]
+    store.delete("old")
+    assert ids("payment") == [] and len(index) == 1
+    assert client.get("/incidents/search?q=").status_code == 400
+
+def test_prefix_search_over_addresses_and_ports_stays_fast():
+    """A numeric prefix expanding to thousands of terms is matched once, not once per term"""
+    import random
+    from search import SearchIndex, tokenize
+    
+    rng = random.Random(5)
+    incidents = [{"id": f"i{n}", "created_at": "2024-01-01 00:00:00",
+                  "description": f"Connection refused from 10.{rng.randint(0, 255)}.{rng.randint(0, 255)}."
+                                 f"{rng.randint(0, 255)} to host-{rng.randint(0, 99999)} port {rng.randint(1, 65535)}"}
+                 for n in range(20000)]
+    index = SearchIndex()
+    index.reset(incidents)
+    expected = sum(any(token.startswith("12") for token in tokenize(i["description"])) for i in incidents)
+    
+    start = time.perf_counter()
+    for query in ("10.12", "port 12", "host-12", "12"):
+        matches, total = index.search(query, 50)
+        assert total == expected and len(matches) == 50
+    # Matching each expansion separately took over a second here
+    assert time.perf_counter() - start < 0.3
+
+def test_near_duplicate_incidents_become_occurrences(app_module, store, monkeypatch):
+    """A near-identical report attaches to the open incident; different or opted-out ones are stored"""
+    from dedupe import DuplicateDetector
+    
+    detector = DuplicateDetector(0.8)
+    store.add_listener(detector)
+    monkeypatch.setattr(app_module, "duplicate_detector", detector)
+    client = app_module.app.test_client()
+    
+    first = client.post("/incidents", json={"description": "Payment API returning 502 errors for checkout requests",
+                                            "priority": "Medium"})
+    assert first.status_code == 201
+    parent_id = first.get_json()["id"]
+    for code in (503, 504):
+        repeat = client.post("/incidents", json={"description": f"Payment API returning {code} errors for checkout requests",
+                                                 "priority": "Critical"})
+        assert repeat.status_code == 200 and repeat.get_json()["id"] == parent_id
+    
+    parent = store.get(parent_id)
+    assert parent["occurrence_count"] == 3 and parent["priority"] == "Critical"
+    assert [o["description"].split()[3] for o in parent["occurrences"]] == ["503", "504"]
+    assert client.post("/incidents", json={"description": "Phishing email reported by finance"}).status_code == 201
+    assert client.post("/incidents", json={"description": "Payment API returning 502 errors for checkout requests",
+                                           "dedupe": False}).status_code == 201
+    
+    # Resolved incidents no longer collect occurrences
+    client.patch(f"/incidents/{parent_id}/resolve")
+    assert detector.match("Payment API returning 500 errors for checkout requests")[0] != parent_id
+    assert len(store.all()) == 3 and len(detector) == 2
+
+def test_metrics_endpoint_reports_routes_timers_and_gauges(app_module, store, monkeypatch):
+    """/metrics exposes per-route latency and status counts, storage and analysis timers and gauges"""
+    from aggregates import IncidentAggregates
+    from metrics import instrument
+    
+    aggregates = IncidentAggregates()
+    store.add_listener(aggregates)
+    instrument(store.backend, app_module.storage_seconds, {"put": "put"})
+    monkeypatch.setattr(app_module, "aggregates", aggregates)
+    client = app_module.app.test_client()
+    
+    def samples():
+        text = client.get("/metrics").data.decode()
+        return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+    
+    before = samples()
+    client.post("/incidents", json={"description": "Metrics probe incident", "priority": "High", "dedupe": False})
+    client.get("/incidents/does-not-exist/analysis")
+    client.post("/incidents/analyze", json={"description": "database error on the payment server"})
+    after = samples()
+    
+    def delta(name):
+        return float(after.get(name, 0)) - float(before.get(name, 0))
+    
+    assert delta('incident_http_requests_total{route="/incidents",method="POST",status="201"}') == 1
+    assert delta('incident_http_requests_total{route="/incidents/<incident_id>/analysis",method="GET",status="404"}') == 1
+    assert delta('incident_http_request_duration_seconds_count{route="/incidents",method="POST"}') == 1
+    assert delta('incident_http_request_duration_seconds_bucket{route="/incidents",method="POST",le="+Inf"}') == 1
+    assert delta('incident_storage_operation_seconds_count{operation="put"}') == 1
+    assert delta('incident_analysis_seconds_count{stage="keywords"}') >= 1
+    assert delta('incident_log_action_seconds_count') >= 2
+    assert after["incident_count"] == "1" and after["incident_open_count"] == "1"
+    assert int(after['incident_file_size_bytes{file="journal"}']) > 0
+
+def test_request_profiler_captures_rotates_and_serves_profiles(app_module, store, tmp_path, monkeypatch):
+    """Requests with the profiling token are captured, old captures rotated out, and reports need the token"""
+    from profiling import RequestProfiler
+    
+    profiler = RequestProfiler(str(tmp_path / "profiles"), token="s3cret", keep=2)
+    monkeypatch.setattr(app_module, "profiler", profiler)
+    monkeypatch.setattr(app_module.app, "wsgi_app", profiler.wrap(app_module.app.wsgi_app))
+    client = app_module.app.test_client()
+    headers = {"X-Profile-Token": "s3cret"}
+    
+    assert "X-Profile-Id" not in client.get("/incidents").headers
+    assert "X-Profile-Id" not in client.get("/incidents", headers={"X-Profile-Token": "wrong"}).headers
+    assert profiler.captures() == []
+    
+    ids = [client.get(path, headers=headers).headers["X-Profile-Id"] for path in
+           ("/incidents", "/insights", "/reports/summary")]
+    captures = profiler.captures()
+    assert [c["id"] for c in captures] == ids[:0:-1]
+    assert captures[0]["method"] == "GET" and captures[0]["route"] == "reports-summary"
+    
+    assert client.get("/admin/profiles").status_code == 403
+    listed = client.get("/admin/profiles", headers=headers).get_json()["profiles"]
+    assert [c["id"] for c in listed] == ids[:0:-1]
+    
+    report = client.get(f"/admin/profiles/{ids[-1]}?sort=tottime&limit=5", headers=headers)
+    assert report.status_code == 200 and "function calls" in report.get_data(as_text=True)
+    raw = client.get(f"/admin/profiles/{ids[-1]}?format=prof", headers=headers)
+    assert raw.status_code == 200 and raw.data
+    assert client.get(f"/admin/profiles/{ids[0]}", headers=headers).status_code == 404
+    assert client.get(f"/admin/profiles/{ids[-1]}?sort=bogus", headers=headers).status_code == 400
+
+def test_production_server_preloads_and_recycles_workers():
+    """run.py serve preloads the app into threaded workers that are recycled with jitter"""
+    import run
+    
+    options = run.server_options("0.0.0.0:8000", workers=3, threads=4, max_requests=1000)
+    assert options["preload_app"] is True
+    assert options["worker_class"] == "gthread" and options["workers"] == 3 and options["threads"] == 4
+    assert options["max_requests"] == 1000 and options["max_requests_jitter"] == 100
+    with pytest.raises(ValueError):
+        run.server_options(threads=1)  # A sync worker would be held by a single /events stream
+
+def test_log_pages_reassemble_multiline_entries(app_module, tmp_path, monkeypatch):
+    """tail/cursor pages and since offsets cover every entry once, with updates as single entries"""
+    log_file = tmp_path / "incident_log.txt"
+    entries = []
+    for n in range(30):
+        if n % 4 == 1:
+            entries.append(f"Incident updated:\nFrom: old {n}\nTo: new {n} at 2025-01-01 00:00:00")
+        else:
+            entries.append(f"Incident created: incident {n} at 2025-01-01 00:00:00")
+    log_file.write_text("\n".join(entries[:20]) + "\n")
+    monkeypatch.setattr(app_module, "LOG_FILE", str(log_file))
+    client = app_module.app.test_client()
+    
+    assert client.get("/logs").get_json()["logs"] == entries[:20]
+    pages, cursor = [], None
+    while True:
+        page = client.get("/logs?tail=6" + (f"&cursor={cursor}" if cursor else "")).get_json()
+        pages.insert(0, page["logs"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [len(p) for p in pages] == [2, 6, 6, 6]
+    assert sum(pages, []) == entries[:20]
+    
+    offset = client.get("/logs?tail=1").get_json()["offset"]
+    with open(log_file, "a") as f:
+        f.write("\n".join(entries[20:]) + "\n")
+    newer = client.get(f"/logs?since={offset}&limit=7").get_json()
+    rest = client.get(f"/logs?since={newer['offset']}").get_json()
+    assert newer["logs"] + rest["logs"] == entries[20:]
+    assert client.get(f"/logs?since={rest['offset']}").get_json()["logs"] == []
+
+def test_audit_log_batches_rotates_and_compresses(tmp_path):
+    """Records are written by the background writer, rotated by size and old segments gzipped"""
+    import gzip
+    from logs import LogReader
+    
+    path = str(tmp_path / "incident_log.txt")
+    with open(path, "w") as f:
+        f.write("Incident created: legacy at 2025-01-01 00:00:00\n")
+    audit = AuditLogger(path, source="test", flush_interval=0.05, fsync="batch", max_bytes=2000, backups=2)
+    
+    start = time.monotonic()
+    for n in range(200):
+        audit.log(f"Incident created: number {n}")
+    assert time.monotonic() - start < 0.5  # nothing waits on the disk
+    audit.flush()
+    assert audit.stats() == {"pending": 0, "written": 200, "dropped": 0}
+    
+    for n in range(60):
+        audit.log(f"Incident created: later {n}")
+        audit.flush()
+    segments = sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("incident_log.txt."))
+    segments = [s for s in segments if s.endswith(".gz")]
+    assert len(segments) == 2
+    newest = gzip.decompress((tmp_path / segments[-1]).read_bytes()).decode().splitlines()
+    assert json.loads(newest[0])["source"] == "test"
+    
+    entries = LogReader(path).all()
+    assert entries and entries[-1].startswith("Incident created: later 59 at ")
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_serializers_agree_on_storage_and_response_json(app_module, name, monkeypatch):
+    """orjson and JSON_SERIALIZER=json write the same bytes, datetimes and non-string keys included"""
+    import serialization
+    from datetime import date
+    
+    chosen = serialization.get_serializer(name)
+    document = {"id": "i1", "description": "Zugriff verweigert ✓", "counts": {3: 1, 2.5: 2, None: 3},
+                "nested": [{"ok": True, "ratio": 0.1}], "big": 2 ** 53}
+    assert chosen.dumps(document) == serialization.StdlibSerializer().dumps(document)
+    assert chosen.loads(chosen.dumps(document)) == json.loads(json.dumps(document))
+    
+    monkeypatch.setattr(app_module, "serializer", chosen)
+    with app_module.app.app_context():
+        response = app_module.app.json.response({"at": datetime(2025, 3, 4, 5, 6, 7), "day": date(2025, 3, 4),
+                                                  7: "seven"})
+    assert response.get_data() == (b'{"at":"Tue, 04 Mar 2025 05:06:07 GMT","day":"Tue, 04 Mar 2025 00:00:00 GMT",'
+                                   b'"7":"seven"}\n')
+
+def test_keyword_matcher_agrees_with_substring_search():
+    """The single-pass matcher finds exactly the keywords a substring check would, overlaps included"""
+    import random
+    from ai_processor import AIProcessor
+    
+    processor = AIProcessor()
+    keywords = sorted(processor._implied)
+    # Keyword fragments glued together produce plenty of overlapping matches
+    fragments = keywords + [k[i:] for k in keywords for i in range(1, len(k))] + [" ", "X"]
+    rng = random.Random(7)
+    for _ in range(5000):
+        text = "".join(rng.choice(fragments) for _ in range(rng.randint(1, 5)))
+        assert processor._scan(text) == {k for k in keywords if k in text.lower()}, text
+    
+    analysis = processor.analyze_incident("Possible data breach on the payment server")
+    assert (analysis["suggested_priority"], analysis["category"], analysis["risk_level"]) == ("Critical", "Security", "High")
+
+def test_analysis_cache_evicts_expires_and_counts(app_module, monkeypatch):
+    """The analysis cache is an LRU with a TTL, keyed by normalised description, with counters in the stats endpoint"""
+    from ai_processor import AnalysisCache
+    
+    now = [1000.0]
+    cache = AnalysisCache(max_size=2, ttl=60, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("c") == 3
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 1, "max_size": 2, "ttl_seconds": 60, "hits": 2, "misses": 2,
+                             "hit_rate": 0.5, "evictions": 1, "expirations": 1}
+    
+    monkeypatch.setattr(app_module.ai_processor, "cache", AnalysisCache(max_size=8, ttl=60, clock=lambda: now[0]))
+    first = app_module.ai_processor.analyze_incident("Database ERROR on the  payment server")
+    again = app_module.ai_processor.analyze_incident("  database error ON the payment server ")
+    assert again["category"] == first["category"] and again["response_steps"] == first["response_steps"]
+    again["response_steps"].append("mutated by a caller")
+    cached = app_module.ai_processor.analyze_incident("database error on the payment server")
+    assert "mutated by a caller" not in cached["response_steps"]
+    now[0] += 61
+    app_module.ai_processor.analyze_incident("database error on the payment server")
+    
+    stats = app_module.app.test_client().get("/incidents/analyze/stats").get_json()["cache"]
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (2, 2, 1, 1)
+    
+    # The result does not depend on which spelling was analysed first
+    results = []
+    for order in (["server down", "server  down"], ["server  down", "server down"]):
+        monkeypatch.setattr(app_module.ai_processor, "cache", AnalysisCache(max_size=8, ttl=60))
+        results.append([app_module.ai_processor.analyze_incident(text)["suggested_priority"] for text in order])
+    assert results[0] == results[1] == [results[0][0]] * 2
+
+def test_remote_model_analysis_against_stub_server(monkeypatch):
+    """Model-backed analysis retries transient errors and falls back to keywords when too slow"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from ai_processor import AIProcessor
+    
+    behaviour = {"mode": "ok", "requests": 0}
+    reply = {"suggested_priority": "High", "category": "Data", "risk_level": "Medium",
+             "response_steps": ["1. Check replication lag", "2. Fail over the replica"]}
+    
+    class StubModel(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            behaviour["requests"] += 1
+            if behaviour["mode"] == "slow":
+                time.sleep(1)
+            if behaviour["mode"] == "flaky" and behaviour["requests"] == 1:
+                body, status = b"{}", 503
+            else:
+                content = "```json\n" + json.dumps(reply) + "\n```"
+                items = json.loads(payload["messages"][-1]["content"]) if behaviour["mode"] == "batch" else None
+                if items is not None:
+                    # The model gets the first item of each group wrong
+                    content = json.dumps({"results": [{"category": "?"}] + [reply] * (len(items) - 1)})
+                body, status = json.dumps({"choices": [{"message": {"content": content}}]}).encode(), 200
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubModel)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setenv("AI_API_URL", f"http://127.0.0.1:{server.server_port}/v1/chat/completions")
+        monkeypatch.setenv("AI_TIMEOUT", "0.5")
+        processor = AIProcessor()
+        
+        analysis = processor.analyze_incident("Replica database lagging")
+        assert analysis["analysis_source"] == "model"
+        assert analysis["category"] == "Data" and analysis["latency_ms"] >= 0
+        
+        behaviour.update(mode="flaky", requests=0)
+        assert processor.analyze_incident("Another database issue")["analysis_source"] == "model"
+        assert behaviour["requests"] == 2
+        
+        behaviour.update(mode="slow", requests=0)
+        fallback = processor.analyze_incident("Ransomware on file server")
+        assert fallback["analysis_source"] == "keywords_fallback"
+        assert fallback["suggested_priority"] == "Critical"
+        
+        stats = processor.analysis_stats()["remote"]
+        assert stats["calls"] == 3 and stats["failures"] == 1 and stats["retries"] >= 1
+        
+        behaviour.update(mode="batch", requests=0)
+        processor.batch_size = 3
+        descriptions = ["Disk full on db-1", "disk FULL on db-1", "", "Queue backlog", "Cache misses", "Replica database lagging"]
+        results = processor.analyze_batch(descriptions)
+        assert behaviour["requests"] == 1  # the last description is already cached
+        assert results[0] == results[1] and results[2] == {"error": "Description cannot be blank"}
+        assert [r.get("analysis_source") for r in results] == [
+            "keywords_fallback", "keywords_fallback", None, "model", "model", "model"]
+    finally:
+        server.shutdown()
+
 if __name__ == "__main__":
     print("Flask App Test Suite")
     print("=" * 40)
@@ -79,4 +940,4 @@ if __name__ == "__main__":
     print("=" * 40)
     
     input("Press Enter when Flask app is running...")
-    test_flask_app()
\ No newline at end of file
+    check_flask_app()
\ No newline at end of file